@@ -0,0 +1,235 @@
+import argparse
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+
+from KicadModTree.KicadFileHandler import KicadFileHandler
+
+import keycap
+import keyswitch_generator
+import util
+from emitter import SwitchFileHandler
+from keyswitch_generator import build_footprint, footprint_specs, keycaps, \
+                                path3d, plan
+from switch import CherryMXBase, SwitchHybridCherryMxAlps, SwitchKailhChoc
+
+
+def _build_all(variants):
+    for variant in variants:
+        build_footprint(variant)
+
+
+def _uncached(fn):
+    # run fn with the keycap, offset, pad and prototype caches cleared, so
+    # benchmarks measure the geometry and not a cache lookup
+    def wrapper():
+        keycap.keycap_outline.cache_clear()
+        util._offset_poly.cache_clear()
+        util._mount_hole_pads.cache_clear()
+        util._switch_pads.cache_clear()
+        keyswitch_generator._prototype.cache_clear()
+        return fn()
+    return wrapper
+
+
+def benchmarks():
+    # name -> (function, number of footprints/items handled per call)
+    benches = {}
+
+    # each footprint spec, built from scratch
+    for spec in footprint_specs:
+        variants = list(plan([spec]))
+        name = f'plan/{spec["group"]}/{spec["class"].__name__}'
+        benches[name] = (_uncached(lambda v=variants: _build_all(v)),
+                         len(variants))
+
+    # each switch class constructor, without keycap
+    for spec in footprint_specs:
+        cls = spec['class']
+        kwargs = dict((k, v[0]) for k, v in spec.get('axes', {}).items())
+        name = f'class/{cls.__name__}'
+        if name not in benches:
+            benches[name] = (_uncached(lambda c=cls, k=kwargs: c(path3d=path3d, **k)), 1)
+
+    # geometry micro benchmarks
+    polys = [SwitchHybridCherryMxAlps.base_polyline,
+             SwitchKailhChoc.polyline_base,
+             SwitchKailhChoc.polyline_base2,
+             CherryMXBase.mx_relief_cutout_polyline]
+    benches['micro/offset_poly'] = (
+        _uncached(lambda: [util.offset_poly(p, 0.25) for p in polys]),
+        len(polys))
+    if util.np is not None:
+        benches['micro/offset_polys_batch'] = (
+            lambda: util.offset_polys(polys * 100, 0.25), len(polys) * 100)
+    benches['micro/keycap'] = (
+        _uncached(lambda: [keycap.Keycap(spacing=19.05, **k)
+                           for k in keycaps.values()]),
+        len(keycaps))
+
+    # serialization of already built footprints
+    footprints = [build_footprint(v) for v in plan()]
+    benches['serialize/KicadFileHandler'] = (
+        lambda: [KicadFileHandler(f).serialize(timestamp=0) for f in footprints],
+        len(footprints))
+    benches['serialize/SwitchFileHandler'] = (
+        lambda: [SwitchFileHandler(f).serialize(timestamp=0) for f in footprints],
+        len(footprints))
+
+    return benches
+
+
+def run(benches, repeat=5):
+    results = {}
+    for name, (fn, items) in benches.items():
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()
+        seconds = min(timer.repeat(repeat=repeat, number=number)) / number
+
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[name] = {'seconds': seconds,
+                         'items_per_second': items / seconds,
+                         'peak_memory': peak}
+        print(f'{name:<70} {items / seconds:12.1f}/s {peak / 1024:10.1f} KiB',
+              file=sys.stderr)
+
+    return results
+
+
+def _retained(build, count):
+    # heap bytes retained per item by the count items build() returns
+    tracemalloc.start()
+    items = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return size / count
+
+
+def heap(specs=footprint_specs, switches=20):
+    # Heap bytes retained per footprint, keeping every built footprint of a
+    # spec alive like a board does, and per switch without keycap built from
+    # scratch instead of derived from a prototype. The specs are built once
+    # before, so the shared caches are warm and not counted, but the
+    # prototypes the keycap variants are derived from are.
+    results = {}
+    for spec in specs:
+        variants = list(plan([spec]))
+        _build_all(variants)
+        keyswitch_generator._prototype.cache_clear()
+        bases = [v for v in variants if v[3] is None] * switches
+        name = f'heap/{spec["group"]}/{spec["class"].__name__}'
+        results[name] = {
+            'bytes_per_footprint': _retained(
+                lambda: [build_footprint(v) for v in variants], len(variants)),
+            'bytes_per_switch': _retained(
+                lambda: [v[1](path3d=path3d, **v[2]) for v in bases],
+                len(bases)),
+        }
+        print(f'{name:<70} '
+              f'{results[name]["bytes_per_footprint"] / 1024:10.1f} KiB/footprint '
+              f'{results[name]["bytes_per_switch"] / 1024:10.1f} KiB/switch',
+              file=sys.stderr)
+    return results
+
+
+def compare(baseline, results, threshold):
+    # a benchmark regresses when its throughput drops or its peak memory
+    # grows by more than threshold (relative) against the baseline
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if current['items_per_second'] < base['items_per_second'] * (1 - threshold):
+            regressions.append(f'{name}: throughput {base["items_per_second"]:.1f}/s '
+                               f'-> {current["items_per_second"]:.1f}/s')
+        if current['peak_memory'] > base['peak_memory'] * (1 + threshold):
+            regressions.append(f'{name}: peak memory {base["peak_memory"]} '
+                               f'-> {current["peak_memory"]} bytes')
+    return regressions
+
+
+def compare_heap(baseline, results, threshold):
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key, unit in [('bytes_per_footprint', 'footprint'),
+                          ('bytes_per_switch', 'switch')]:
+            if key in base and current[key] > base[key] * (1 + threshold):
+                regressions.append(f'{name}: heap {base[key]:.0f} '
+                                   f'-> {current[key]:.0f} bytes per {unit}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the keyswitch library generator.',
+        usage='%(prog)s [options]')
+
+    parser.add_argument('-o', '--output',
+                        type=str, default=None,
+                        help='write results as JSON to this file')
+
+    parser.add_argument('-c', '--compare',
+                        type=str, default=None,
+                        help='baseline JSON file to compare the results with, '
+                             'exits with status 1 on regressions')
+
+    parser.add_argument('-t', '--threshold',
+                        type=float, default=0.1,
+                        help='allowed relative regression '
+                             '(default: %(default)s)')
+
+    parser.add_argument('-k', '--filter',
+                        type=str, default='',
+                        help='only run benchmarks whose name contains this')
+
+    parser.add_argument('-r', '--repeat',
+                        type=int, default=5,
+                        help='timing repetitions, the best one is kept '
+                             '(default: %(default)s)')
+
+    parser.add_argument('--heap',
+                        action='store_true',
+                        help='also measure the heap retained per footprint')
+
+    args = parser.parse_args()
+
+    benches = {name: bench for name, bench in benchmarks().items()
+               if args.filter in name}
+    results = run(benches, repeat=args.repeat)
+
+    report = {'python': platform.python_version(),
+              'machine': platform.machine(),
+              'benchmarks': results}
+
+    if args.heap:
+        specs = [spec for spec in footprint_specs
+                 if args.filter in f'heap/{spec["group"]}/{spec["class"].__name__}']
+        report['heap'] = heap(specs)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline['benchmarks'], results, args.threshold)
+        if args.heap:
+            regressions += compare_heap(baseline.get('heap', {}),
+                                        report['heap'], args.threshold)
+        for regression in regressions:
+            print(f'regression: {regression}')
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,359 @@
+import argparse
+import json
+import math
+import os
+import sys
+import uuid
+
+from KicadModTree.nodes.base import Pad
+
+from emitter import SwitchFileHandler, _num, _width
+from keyswitch_generator import build_footprint
+from spatial import rotate
+
+BOARD_VERSION = 20211014
+
+_LAYERS = [(0, 'F.Cu', 'signal'), (31, 'B.Cu', 'signal'),
+           (32, 'B.Adhes', 'user', 'B.Adhesive'),
+           (33, 'F.Adhes', 'user', 'F.Adhesive'),
+           (34, 'B.Paste', 'user'), (35, 'F.Paste', 'user'),
+           (36, 'B.SilkS', 'user', 'B.Silkscreen'),
+           (37, 'F.SilkS', 'user', 'F.Silkscreen'),
+           (38, 'B.Mask', 'user'), (39, 'F.Mask', 'user'),
+           (40, 'Dwgs.User', 'user', 'User.Drawings'),
+           (41, 'Cmts.User', 'user', 'User.Comments'),
+           (42, 'Eco1.User', 'user', 'User.Eco1'),
+           (43, 'Eco2.User', 'user', 'User.Eco2'),
+           (44, 'Edge.Cuts', 'user'), (45, 'Margin', 'user'),
+           (46, 'B.CrtYd', 'user', 'B.Courtyard'),
+           (47, 'F.CrtYd', 'user', 'F.Courtyard'),
+           (48, 'B.Fab', 'user'), (49, 'F.Fab', 'user')]
+
+# layers the board outline is fitted around
+_OUTLINE_LAYERS = ['Dwgs.User', 'F.CrtYd', 'B.CrtYd']
+
+# KiCad 6 spells the KiCad 5 footprint attributes differently
+_ATTRIBUTES = {None: 'through_hole', 'smd': 'smd',
+               'virtual': 'exclude_from_pos_files exclude_from_bom'}
+
+
+def _q(value):
+    value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{value}"'
+
+
+def _layers(layers):
+    return ' '.join(layer if layer.startswith('*') else _q(layer)
+                    for layer in layers)
+
+
+class Body:
+    # A footprint rendered once in board file syntax, as a str.format()
+    # template. Each field is either a new tstamp or the rotation of a text or
+    # pad, which KiCad stores in board coordinates, so instances only fill in
+    # uuids and angles.
+
+    def __init__(self, footprint, lib_id):
+        self.lib_id = lib_id
+        self.parts = []
+        self.fields = []
+        self.points = []
+
+        self._static(f'    (descr {_q(footprint.description)})\n')
+        self._static(f'    (tags {_q(footprint.tags)})\n')
+        self._static(f'    (attr {_ATTRIBUTES[footprint.attribute]})\n')
+
+        for node_type, node in SwitchFileHandler(footprint).nodes():
+            getattr(self, f'_{node_type.lower()}')(node)
+
+        self.template = ''.join(self.parts)
+        del self.parts
+
+    def _static(self, text):
+        self.parts.append(text.replace('{', '{{').replace('}', '}}'))
+
+    def _angle(self, angle):
+        self.parts.append('{}')
+        self.fields.append(angle)
+
+    def _tstamp(self, end=')\n'):
+        self._static(' (tstamp ')
+        self.parts.append('{}')
+        self.fields.append(None)
+        self._static(')' + end)
+
+    def _outline(self, layer, *points):
+        if layer in _OUTLINE_LAYERS:
+            self.points += points
+
+    def _text(self, node):
+        text = '${REFERENCE}' if node.type == 'user' and \
+            node.text == '%R' else node.text
+        if node.type == 'reference':
+            self.parts.append('{}')
+            self.fields.append('reference')
+        else:
+            self._static(f'    (fp_text {node.type} {_q(text)}')
+        self._static(f' (at {_num(node.at.x)} {_num(node.at.y)}')
+        self._angle(node.rotation)
+        hide = ' hide' if node.hide else ''
+        mirror = ' (justify mirror)' if node.mirror else ''
+        self._static(f') (layer {_q(node.layer)}){hide}\n'
+                     f'      (effects (font (size {_num(node.size.x)} '
+                     f'{_num(node.size.y)}) (thickness {_num(node.thickness)}))'
+                     f'{mirror})\n     ')
+        self._tstamp(end='\n    )\n')
+
+    def _arc(self, node):
+        cx, cy = node.center_pos.x, node.center_pos.y
+        sx, sy = node.start_pos.x, node.start_pos.y
+        a = math.radians(node.angle)
+
+        def rotated(a):
+            return (cx + (sx - cx) * math.cos(a) - (sy - cy) * math.sin(a),
+                    cy + (sx - cx) * math.sin(a) + (sy - cy) * math.cos(a))
+
+        start, mid, end = (sx, sy), rotated(a / 2), rotated(a)
+        if node.angle < 0:
+            start, end = end, start
+        self._static(f'    (fp_arc (start {_num(start[0])} {_num(start[1])}) '
+                     f'(mid {_num(mid[0])} {_num(mid[1])}) '
+                     f'(end {_num(end[0])} {_num(end[1])}) '
+                     f'(layer {_q(node.layer)}) '
+                     f'(width {_width(node.layer, node.width)})')
+        self._tstamp()
+        self._outline(node.layer, start, mid, end)
+
+    def _circle(self, node):
+        cx, cy, r = node.center_pos.x, node.center_pos.y, node.radius
+        self._static(f'    (fp_circle (center {_num(cx)} {_num(cy)}) '
+                     f'(end {_num(cx + r)} {_num(cy)}) '
+                     f'(layer {_q(node.layer)}) '
+                     f'(width {_width(node.layer, node.width)}) (fill none)')
+        self._tstamp()
+        self._outline(node.layer, (cx - r, cy - r), (cx + r, cy + r))
+
+    def _line(self, node):
+        self._static(f'    (fp_line (start {_num(node.start_pos.x)} '
+                     f'{_num(node.start_pos.y)}) '
+                     f'(end {_num(node.end_pos.x)} {_num(node.end_pos.y)}) '
+                     f'(layer {_q(node.layer)}) '
+                     f'(width {_width(node.layer, node.width)})')
+        self._tstamp()
+        self._outline(node.layer, (node.start_pos.x, node.start_pos.y),
+                      (node.end_pos.x, node.end_pos.y))
+
+    def _polygon(self, node):
+        points = ' '.join(f'(xy {_num(n.x)} {_num(n.y)})' for n in node.nodes)
+        self._static(f'    (fp_poly (pts {points}) (layer {_q(node.layer)}) '
+                     f'(width {_width(node.layer, node.width)}) (fill solid)')
+        self._tstamp()
+        self._outline(node.layer, *((n.x, n.y) for n in node.nodes))
+
+    def _pad(self, node):
+        if node.shape == Pad.SHAPE_CUSTOM:
+            raise NotImplementedError('custom pads are not supported')
+
+        self._static(f'    (pad {_q(node.number)} {node.type} {node.shape} '
+                     f'(at {_num(node.at.x)} {_num(node.at.y)}')
+        self._angle(node.rotation)
+        pad = f') (size {_num(node.size.x)} {_num(node.size.y)})'
+
+        if node.type in [Pad.TYPE_THT, Pad.TYPE_NPTH]:
+            if node.drill.x == node.drill.y:
+                pad += f' (drill {_num(node.drill.x)}'
+            else:
+                pad += f' (drill oval {_num(node.drill.x)} {_num(node.drill.y)}'
+            if node.offset.x != 0 or node.offset.y != 0:
+                pad += f' (offset {_num(node.offset.x)} {_num(node.offset.y)})'
+            pad += ')'
+
+        pad += f' (layers {_layers(node.layers)})'
+
+        if node.shape == Pad.SHAPE_ROUNDRECT:
+            pad += f' (roundrect_rratio {_num(node.radius_ratio)})'
+        if node.solder_mask_margin != 0:
+            pad += f' (solder_mask_margin {_num(node.solder_mask_margin)})'
+        if node.solder_paste_margin_ratio != 0:
+            pad += (f' (solder_paste_margin_ratio '
+                    f'{_num(node.solder_paste_margin_ratio)})')
+        if node.solder_paste_margin != 0:
+            pad += f' (solder_paste_margin {_num(node.solder_paste_margin)})'
+
+        self._static(pad)
+        self._tstamp()
+
+    def _model(self, node):
+        self._static(f'    (model {_q(node.filename)}\n'
+                     f'      (offset (xyz {_num(node.at.x)} {_num(node.at.y)} '
+                     f'{_num(node.at.z)}))\n'
+                     f'      (scale (xyz {_num(node.scale.x)} '
+                     f'{_num(node.scale.y)} {_num(node.scale.z)}))\n'
+                     f'      (rotate (xyz {_num(node.rotate.x)} '
+                     f'{_num(node.rotate.y)} {_num(node.rotate.z)}))\n'
+                     f'    )\n')
+
+
+class BoardWriter:
+    # Streams a .kicad_pcb with one footprint per placement (see
+    # kle.place()). Bodies are rendered once per distinct footprint. tstamps
+    # are derived from seed and the reference designators, so the same
+    # placements always give the same board file.
+
+    def __init__(self, stream, title=None, seed=None, origin=(25.4, 25.4)):
+        self.stream = stream
+        self.origin = origin
+        self.namespace = uuid.uuid5(uuid.NAMESPACE_URL, f'{seed or title}')
+        self.bodies = {}
+        self.bbox = None
+
+        stream.write(f'(kicad_pcb (version {BOARD_VERSION}) '
+                     f'(generator keyswitch_generator)\n\n'
+                     f'  (general\n    (thickness 1.6)\n  )\n\n'
+                     f'  (paper "A4")\n')
+        if title:
+            stream.write(f'  (title_block\n    (title {_q(title)})\n  )\n')
+        stream.write('\n  (layers\n')
+        for layer in _LAYERS:
+            stream.write(f'    ({layer[0]} {_q(layer[1])} {layer[2]}'
+                         + (f' {_q(layer[3])}' if len(layer) > 3 else '')
+                         + ')\n')
+        stream.write('  )\n\n'
+                     '  (setup\n    (pad_to_mask_clearance 0)\n  )\n\n'
+                     '  (net 0 "")\n\n')
+
+    def _uuid(self, name):
+        return uuid.uuid5(self.namespace, name)
+
+    def body(self, variant, lib_id):
+        body = self.bodies.get(lib_id)
+        if body is None:
+            body = self.bodies[lib_id] = Body(build_footprint(variant), lib_id)
+        return body
+
+    def add(self, placement):
+        lib_id = f'{placement["group"]}:{placement["footprint"]}'
+        body = self.body(placement['variant'], lib_id)
+
+        reference = placement['reference']
+        rotation = placement['rotation'] % 360
+        x = placement['x'] + self.origin[0]
+        y = placement['y'] + self.origin[1]
+
+        values = []
+        for i, field in enumerate(body.fields):
+            if field is None:
+                values.append(self._uuid(f'{reference}/{i}'))
+            elif field == 'reference':
+                values.append(f'    (fp_text reference {_q(reference)}')
+            else:
+                angle = (field + rotation) % 360
+                values.append(f' {_num(angle)}' if angle else '')
+
+        at = f'{_num(x)} {_num(y)}' + (f' {_num(rotation)}' if rotation else '')
+        self.stream.write(f'  (footprint {_q(lib_id)} (layer "F.Cu")\n'
+                          f'    (tedit 0) (tstamp {self._uuid(reference)})\n'
+                          f'    (at {at})\n')
+        self.stream.write(body.template.format(*values))
+        self.stream.write('  )\n\n')
+
+        for px, py in body.points:
+            px, py = rotate(px, py, rotation)
+            px, py = px + x, py + y
+            if self.bbox is None:
+                self.bbox = [px, py, px, py]
+            else:
+                self.bbox = [min(self.bbox[0], px), min(self.bbox[1], py),
+                             max(self.bbox[2], px), max(self.bbox[3], py)]
+
+    def close(self, margin=1):
+        # board outline around every keycap and courtyard, then the board end
+        if self.bbox is not None:
+            x0, y0 = self.bbox[0] - margin, self.bbox[1] - margin
+            x1, y1 = self.bbox[2] + margin, self.bbox[3] + margin
+            for i, (start, end) in enumerate([((x0, y0), (x1, y0)),
+                                              ((x1, y0), (x1, y1)),
+                                              ((x1, y1), (x0, y1)),
+                                              ((x0, y1), (x0, y0))]):
+                self.stream.write(
+                    f'  (gr_line (start {_num(start[0])} {_num(start[1])}) '
+                    f'(end {_num(end[0])} {_num(end[1])}) '
+                    f'(layer "Edge.Cuts") (width 0.1) '
+                    f'(tstamp {self._uuid(f"Edge.Cuts/{i}")}))\n')
+            self.stream.write('\n')
+        self.stream.write(')\n')
+
+
+def write_board(filename, placements, title=None, seed=None):
+    tmp_filename = f'{filename}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_filename, 'w', newline='\n') as f:
+            board = BoardWriter(f, title=title, seed=seed)
+            for placement in placements:
+                board.add(placement)
+            board.close()
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.unlink(tmp_filename)
+        raise
+
+
+if __name__ == '__main__':
+    from kle import _option, parse, place, switch_class
+
+    parser = argparse.ArgumentParser(
+        description='Write a KiCad board with the footprints of a '
+                    'keyboard-layout-editor layout.',
+        usage='%(prog)s [options] layout.json')
+
+    parser.add_argument('layout', type=str,
+                        help='KLE JSON layout (Download JSON)')
+
+    parser.add_argument('-o', '--output',
+                        type=str, default=None,
+                        help='board file (default: the layout name with '
+                             '.kicad_pcb)')
+
+    parser.add_argument('-c', '--class',
+                        type=str, default='SwitchCherryMX', dest='cls',
+                        help='switch class (default: %(default)s)')
+
+    parser.add_argument('-O', '--option',
+                        type=_option, action='append', default=[],
+                        help='switch class parameter, e.g. switch_type=PCB')
+
+    parser.add_argument('--no-keycap',
+                        action='store_true',
+                        help='place footprints without keycap outline')
+
+    parser.add_argument('--no-stabilizer',
+                        action='store_true',
+                        help='do not place stabilizers')
+
+    parser.add_argument('--seed',
+                        type=str, default=None,
+                        help='seed of the tstamps (default: the layout name)')
+
+    args = parser.parse_args()
+
+    with open(args.layout) as f:
+        layout = json.load(f)
+
+    cls, kwargs = switch_class(parser, args)
+    try:
+        placements = place(parse(layout), cls, kwargs,
+                           with_keycaps=not args.no_keycap,
+                           stabilizers=not args.no_stabilizer)
+    except ValueError as e:
+        parser.error(str(e))
+
+    name = os.path.splitext(os.path.basename(args.layout))[0]
+    if isinstance(layout[0], dict) and layout[0].get('name'):
+        name = layout[0]['name']
+
+    output = args.output or os.path.splitext(args.layout)[0] + '.kicad_pcb'
+    write_board(output, placements, title=name, seed=args.seed or name)
+    print(f'{len(placements)} footprints written to {output}')
+
+    sys.exit(0)
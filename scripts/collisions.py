@@ -0,0 +1,122 @@
+import argparse
+import json
+import sys
+
+from emitter import SwitchFileHandler
+from keyswitch_generator import build_footprint
+from spatial import GridIndex, area, bbox, loops, node_segments, \
+                    polygons_overlap, rotate
+
+# check -> outline it compares between footprints, the back courtyard is the
+# one of hotswap sockets
+CHECKS = {'courtyard': 'F.CrtYd',
+          'socket': 'B.CrtYd',
+          'keycap': 'keycap'}
+
+
+def _outlines(segments):
+    result = []
+    for loop in loops(segments):
+        if area(loop) < 0:
+            loop.reverse()
+        result.append(loop)
+    return result
+
+
+def footprint_outlines(footprint):
+    # closed, positively oriented outlines of a footprint per CHECKS outline:
+    # its courtyards and the Dwgs.User outline of its keycap
+    segments = dict((outline, []) for outline in CHECKS.values())
+    for node_type, node in SwitchFileHandler(footprint).nodes():
+        layer = getattr(node, 'layer', None)
+        if layer in segments:
+            segments[layer] += node_segments(node_type, node)
+
+    keycap = getattr(footprint, 'keycap', None)
+    if keycap is not None:
+        for node_type, node in SwitchFileHandler(keycap).nodes():
+            segments['keycap'] += node_segments(node_type, node)
+
+    return dict((outline, _outlines(s)) for outline, s in segments.items())
+
+
+def check(placements, checks=CHECKS):
+    # Overlapping outlines of placed footprints (see kle.place()), as sorted
+    # (check, reference, reference) tuples. Outlines go into a grid index per
+    # check and only outlines with overlapping bounding boxes are compared.
+    outlines = {}
+    indexes = dict((name, GridIndex()) for name in checks)
+    owners = dict((name, []) for name in checks)
+    polygons = dict((name, []) for name in checks)
+
+    for placement in placements:
+        lib_id = f'{placement["group"]}:{placement["footprint"]}'
+        if lib_id not in outlines:
+            outlines[lib_id] = footprint_outlines(
+                build_footprint(placement['variant']))
+
+        for name in checks:
+            for outline in outlines[lib_id][checks[name]]:
+                polygon = []
+                for x, y in outline:
+                    x, y = rotate(x, y, placement['rotation'])
+                    polygon.append((x + placement['x'], y + placement['y']))
+                indexes[name].insert(bbox(polygon))
+                owners[name].append(placement['reference'])
+                polygons[name].append(polygon)
+
+    collisions = set()
+    for name, index in indexes.items():
+        for a, b in index.pairs():
+            ref_a, ref_b = owners[name][a], owners[name][b]
+            if ref_a == ref_b or (name, ref_a, ref_b) in collisions:
+                continue
+            if polygons_overlap(polygons[name][a], polygons[name][b]):
+                collisions.add((name, ref_a, ref_b))
+                collisions.add((name, ref_b, ref_a))
+
+    return sorted(c for c in collisions if _reference_key(c[1]) <
+                  _reference_key(c[2]))
+
+
+def _reference_key(reference):
+    # SW2 sorts before SW10
+    prefix = reference.rstrip('0123456789')
+    return prefix, int(reference[len(prefix):] or 0)
+
+
+if __name__ == '__main__':
+    from kle import _option, parse, place, switch_class
+
+    parser = argparse.ArgumentParser(
+        description='Report overlapping courtyards, hotswap sockets and '
+                    'keycaps of a keyboard-layout-editor layout.',
+        usage='%(prog)s [options] layout.json')
+
+    parser.add_argument('layout', type=str,
+                        help='KLE JSON layout (Download JSON)')
+
+    parser.add_argument('-c', '--class',
+                        type=str, default='SwitchCherryMX', dest='cls',
+                        help='switch class (default: %(default)s)')
+
+    parser.add_argument('-O', '--option',
+                        type=_option, action='append', default=[],
+                        help='switch class parameter, e.g. switch_type=PCB')
+
+    args = parser.parse_args()
+
+    with open(args.layout) as f:
+        keys = parse(json.load(f))
+
+    cls, kwargs = switch_class(parser, args)
+    try:
+        placements = place(keys, cls, kwargs, stabilizers=False)
+    except ValueError as e:
+        parser.error(str(e))
+    collisions = check(placements)
+
+    for name, ref_a, ref_b in collisions:
+        print(f'{name}: {ref_a} {ref_b}')
+
+    sys.exit(1 if collisions else 0)
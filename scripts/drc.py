@@ -0,0 +1,299 @@
+import math
+
+from KicadModTree.nodes.base import Pad
+
+from emitter import SwitchFileHandler
+from spatial import loops, node_segments
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# minimum copper to copper and hole to copper distance between pads of
+# different nets, in mm
+CLEARANCE = 0.2
+# minimum copper ring around a drill, SwitchPad small_top pads have 0.065
+ANNULAR_RING = 0.05
+# distance silkscreen lines are sampled at, in mm
+SILK_STEP = 0.05
+
+_EPS = 1e-6
+
+
+class _Shapes:
+    # Pads and holes as rounded rectangles: an inner rectangle of half size
+    # hx, hy rotated by angle (radians, KiCad orientation) around cx, cy,
+    # grown by radius r. Circles and ovals have a point or segment inside.
+
+    def __init__(self, rows):
+        a = np.array(rows, dtype=float).reshape(-1, 6)
+        self.cx, self.cy, self.angle, self.hx, self.hy, self.r = a.T
+        self.cos = np.cos(self.angle)
+        self.sin = np.sin(self.angle)
+
+    def __len__(self):
+        return len(self.cx)
+
+    def vertices(self):
+        # inner rectangle corners, (n, 4, 2)
+        sx = np.array([-1, 1, 1, -1])
+        sy = np.array([-1, -1, 1, 1])
+        lx = sx[None, :] * self.hx[:, None]
+        ly = sy[None, :] * self.hy[:, None]
+        x = self.cx[:, None] + lx * self.cos[:, None] + ly * self.sin[:, None]
+        y = self.cy[:, None] - lx * self.sin[:, None] + ly * self.cos[:, None]
+        return np.stack([x, y], axis=-1)
+
+    def boundary(self, n=16):
+        # n points around each outline, (shapes, n, 2)
+        t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+        dx, dy = np.cos(t), np.sin(t)
+        lx = np.sign(dx)[None, :] * self.hx[:, None] + self.r[:, None] * dx
+        ly = np.sign(dy)[None, :] * self.hy[:, None] + self.r[:, None] * dy
+        x = self.cx[:, None] + lx * self.cos[:, None] + ly * self.sin[:, None]
+        y = self.cy[:, None] - lx * self.sin[:, None] + ly * self.cos[:, None]
+        return np.stack([x, y], axis=-1)
+
+    def distance(self, points):
+        # signed distance of points (n, 2) to every shape, (n, shapes),
+        # negative inside
+        dx = points[:, 0, None] - self.cx[None, :]
+        dy = points[:, 1, None] - self.cy[None, :]
+        lx = np.abs(dx * self.cos - dy * self.sin) - self.hx
+        ly = np.abs(dx * self.sin + dy * self.cos) - self.hy
+        outside = np.hypot(np.maximum(lx, 0), np.maximum(ly, 0))
+        return outside + np.minimum(np.maximum(lx, ly), 0) - self.r
+
+
+def _segment_distance(p, a, b):
+    # distance of points p to segments ab, broadcasting over leading axes
+    d = b - a
+    length2 = (d ** 2).sum(-1)
+    t = ((p - a) * d).sum(-1) / np.where(length2 > 0, length2, 1)
+    t = np.clip(t, 0, 1)
+    return np.hypot(*np.moveaxis(a + d * t[..., None] - p, -1, 0))
+
+
+def _cross(o, a, b):
+    return ((a[..., 0] - o[..., 0]) * (b[..., 1] - o[..., 1]) -
+            (a[..., 1] - o[..., 1]) * (b[..., 0] - o[..., 0]))
+
+
+def _pair_distances(shapes):
+    # distance between every two shapes, (n, n), 0 when they overlap
+    v = shapes.vertices()
+    e0, e1 = v, np.roll(v, -1, axis=1)
+
+    # vertices of i against the edges of j, and the other way around
+    p = v[:, None, :, None, :]
+    a = e0[None, :, None, :, :]
+    b = e1[None, :, None, :, :]
+    d = _segment_distance(p, a, b).min(axis=(2, 3))
+    d = np.minimum(d, d.T)
+
+    # crossing edges
+    a0, a1 = e0[:, None, :, None, :], e1[:, None, :, None, :]
+    b0, b1 = e0[None, :, None, :, :], e1[None, :, None, :, :]
+    crossing = ((_cross(a0, a1, b0) * _cross(a0, a1, b1) < 0) &
+                (_cross(b0, b1, a0) * _cross(b0, b1, a1) < 0)).any(axis=(2, 3))
+
+    # vertices inside the other inner rectangle
+    inner = _Shapes(np.stack([shapes.cx, shapes.cy, shapes.angle,
+                              shapes.hx, shapes.hy, np.zeros(len(shapes))],
+                             axis=1))
+    n = len(shapes)
+    contained = (inner.distance(v.reshape(-1, 2)).reshape(n, 4, n)
+                 <= _EPS).any(axis=1)
+    contained = contained | contained.T
+
+    d = np.where(crossing | contained, 0, d)
+    return np.maximum(d - shapes.r[:, None] - shapes.r[None, :], 0)
+
+
+def _sides(layers, kind):
+    # 'F' and 'B' sides a pad has kind ('Cu', 'Mask') on
+    sides = set()
+    for layer in layers:
+        if layer == f'*.{kind}':
+            sides |= {'F', 'B'}
+        elif layer in [f'F.{kind}', f'B.{kind}']:
+            sides.add(layer[0])
+    return sides
+
+
+def _shape(at, angle, size, offset, shape, radius_ratio):
+    ox, oy = offset
+    cos, sin = math.cos(angle), math.sin(angle)
+    cx, cy = at[0] + ox * cos + oy * sin, at[1] - ox * sin + oy * cos
+    w, h = size
+    if shape in [Pad.SHAPE_CIRCLE, Pad.SHAPE_OVAL]:
+        r = min(w, h) / 2
+    elif shape == Pad.SHAPE_ROUNDRECT:
+        r = radius_ratio * min(w, h)
+    else:
+        r = 0
+    return cx, cy, angle, w / 2 - r, h / 2 - r, r
+
+
+def _silk_points(segments):
+    # points every SILK_STEP along silkscreen segments (x0, y0, x1, y1, half
+    # width), with the half width of their line, (n, 3)
+    segments = np.array(segments, dtype=float).reshape(-1, 5)
+    lengths = np.hypot(segments[:, 2] - segments[:, 0],
+                       segments[:, 3] - segments[:, 1])
+    steps = np.maximum(1, np.ceil(lengths / SILK_STEP)).astype(int)
+    index = np.repeat(np.arange(len(segments)), steps + 1)
+    t = np.concatenate([np.linspace(0, 1, n + 1) for n in steps])
+    s = segments[index]
+    return np.stack([s[:, 0] + (s[:, 2] - s[:, 0]) * t,
+                     s[:, 1] + (s[:, 3] - s[:, 1]) * t, s[:, 4]], axis=1)
+
+
+def check(footprint, clearance=CLEARANCE, annular_ring=ANNULAR_RING):
+    # Design rule violations of a built footprint, as messages. Pads are
+    # compared all at once with numpy: copper clearance between nets and to
+    # holes, annular rings, pads sharing a number without touching, solder
+    # mask openings over copper and drills, pads outside the courtyard and
+    # silkscreen on pads.
+    pads = []
+    courtyard = []
+    silk = {'F': [], 'B': []}
+    for node_type, node in SwitchFileHandler(footprint).nodes():
+        layer = getattr(node, 'layer', None)
+        if node_type == 'Pad':
+            pads.append(node)
+        elif layer in ['F.CrtYd', 'B.CrtYd']:
+            courtyard += node_segments(node_type, node)
+        elif layer in ['F.SilkS', 'B.SilkS'] and node_type != 'Text':
+            width = node.width if node.width is not None else 0.12
+            if node_type == 'Polygon':
+                points = [(n.x, n.y) for n in node.nodes]
+                lines = list(zip(points, points[1:] + points[:1]))
+            else:
+                lines = node_segments(node_type, node)
+            silk[layer[0]] += [(*a, *b, width / 2) for a, b in lines]
+    if not pads:
+        return []
+
+    violations = []
+
+    numbers = [str(pad.number) for pad in pads]
+    copper = [set() if pad.type == Pad.TYPE_NPTH else _sides(pad.layers, 'Cu')
+              for pad in pads]
+    mask = [_sides(pad.layers, 'Mask') for pad in pads]
+    drilled = [pad.type in [Pad.TYPE_THT, Pad.TYPE_NPTH] for pad in pads]
+
+    def name(i):
+        return f'pad {numbers[i] or "(unnumbered)"} at ' \
+               f'({pads[i].at.x:g}, {pads[i].at.y:g})'
+
+    shapes = _Shapes([_shape((pad.at.x, pad.at.y),
+                             math.radians(pad.rotation),
+                             (pad.size.x, pad.size.y),
+                             (pad.offset.x, pad.offset.y),
+                             pad.shape, pad.radius_ratio) for pad in pads])
+    holes = _Shapes([_shape((pad.at.x, pad.at.y), math.radians(pad.rotation),
+                            (pad.drill.x, pad.drill.y) if d else (0, 0),
+                            (0, 0), Pad.SHAPE_OVAL, 0)
+                     for pad, d in zip(pads, drilled)])
+
+    # pads and holes in one go, pads first
+    n = len(pads)
+    both = _pair_distances(_Shapes(np.concatenate([
+        np.stack([s.cx, s.cy, s.angle, s.hx, s.hy, s.r], axis=1)
+        for s in [shapes, holes]])))
+    distance = both[:n, :n]
+    hole_distance = both[n:, :n]
+
+    for i in range(len(pads)):
+        for j in range(i + 1, len(pads)):
+            if copper[i] & copper[j] and numbers[i] != numbers[j] and \
+                    distance[i, j] < clearance - _EPS:
+                violations.append(f'{name(i)} and {name(j)} are '
+                                  f'{distance[i, j]:.3f}mm apart')
+        for j in range(len(pads)):
+            if drilled[i] and copper[j] and numbers[i] != numbers[j] and \
+                    hole_distance[i, j] < clearance - _EPS:
+                violations.append(f'drill of {name(i)} is '
+                                  f'{hole_distance[i, j]:.3f}mm from '
+                                  f'{name(j)}')
+
+    # annular ring, in the pad frame the drill sits at -offset
+    for i, pad in enumerate(pads):
+        if pad.type != Pad.TYPE_THT:
+            continue
+        ring = min(pad.size.x / 2 - abs(pad.offset.x) - pad.drill.x / 2,
+                   pad.size.y / 2 - abs(pad.offset.y) - pad.drill.y / 2)
+        if ring < annular_ring - _EPS:
+            violations.append(f'{name(i)} has a {ring:.3f}mm annular ring')
+
+    # pads sharing a number must be connected through their copper
+    for number in sorted(set(numbers) - {''}):
+        group = [i for i in range(len(pads))
+                 if numbers[i] == number and copper[i]]
+        connected = set(group[:1])
+        changed = True
+        while changed:
+            changed = False
+            for i in group:
+                if i not in connected and any(
+                        copper[i] & copper[j] and distance[i, j] <= _EPS
+                        for j in connected):
+                    connected.add(i)
+                    changed = True
+        if len(connected) != len(group):
+            violations.append(f'pad number {number} is used by '
+                              f'{len(group)} pads that do not touch')
+
+    # mask openings: over the drill of plated holes on every copper side,
+    # and never without copper or a hole underneath
+    hole_points = holes.boundary()
+    for i, pad in enumerate(pads):
+        if pad.type == Pad.TYPE_THT:
+            for side in sorted(copper[i]):
+                openings = [j for j in range(len(pads)) if side in mask[j]]
+                if not openings or not (shapes.distance(
+                        hole_points[i])[:, openings] <= _EPS).all(axis=0).any():
+                    violations.append(f'{name(i)} has no {side}.Mask '
+                                      f'opening over its drill')
+        elif mask[i] and not copper[i] and not drilled[i]:
+            under = [j for j in range(len(pads)) if j != i and
+                     (mask[i] & copper[j] or drilled[j])]
+            if not any(distance[i, j] <= _EPS or hole_distance[j, i] <= _EPS
+                       for j in under):
+                violations.append(f'{name(i)} opens the mask without '
+                                  f'copper or a hole underneath')
+
+    # pads inside the courtyard
+    courtyard = loops(courtyard)
+    if courtyard:
+        points = np.concatenate([shapes.boundary(), hole_points], axis=1)
+        inside = np.zeros(points.shape[:2], dtype=bool)
+        flat = points.reshape(-1, 2)
+        for polygon in courtyard:
+            poly = np.array(polygon)
+            a, b = poly, np.roll(poly, -1, axis=0)
+            px, py = flat[:, 0, None], flat[:, 1, None]
+            crosses = ((a[:, 1] > py) != (b[:, 1] > py)) & \
+                (px < a[:, 0] + (py - a[:, 1]) * (b[:, 0] - a[:, 0]) /
+                 np.where(b[:, 1] != a[:, 1], b[:, 1] - a[:, 1], 1))
+            on_edge = _segment_distance(flat[:, None, :], a[None], b[None]) \
+                .min(axis=1) <= 1e-3
+            inside |= ((crosses.sum(axis=1) % 2 == 1) | on_edge) \
+                .reshape(inside.shape)
+        for i in np.nonzero(~inside.all(axis=1))[0]:
+            violations.append(f'{name(i)} is outside the courtyard')
+
+    # silkscreen over exposed copper, mask openings and holes
+    for side, segments in silk.items():
+        exposed = [i for i in range(len(pads))
+                   if side in copper[i] or side in mask[i] or drilled[i]]
+        if not segments or not exposed:
+            continue
+        points = _silk_points(segments)
+        d = shapes.distance(points[:, :2])[:, exposed] - points[:, 2, None]
+        for k in np.nonzero((d < -_EPS).any(axis=0))[0]:
+            violations.append(f'{side}.SilkS overlaps {name(exposed[k])}')
+
+    return violations
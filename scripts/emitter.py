@@ -0,0 +1,222 @@
+import io
+import re
+import time
+
+from KicadModTree.FileHandler import FileHandler
+from KicadModTree.nodes.base import Pad
+
+from util import PadGeometry, shared_childs
+
+DEFAULT_LAYER_WIDTH = {'F.SilkS': 0.12,
+                       'B.SilkS': 0.12,
+                       'F.Fab': 0.10,
+                       'B.Fab': 0.10,
+                       'F.CrtYd': 0.05,
+                       'B.CrtYd': 0.05}
+
+DEFAULT_WIDTH = 0.15
+
+# KicadFileHandler renders base nodes grouped by class name, in this order
+_BASE_NODES = ['Arc', 'Circle', 'Line', 'Pad', 'Polygon', 'Text']
+
+_WHITESPACE = re.compile(r'.*\s.*')
+
+
+def _num(value):
+    if type(value) is int:
+        return str(value)
+    result = ('%f' % value).rstrip('0').rstrip('.')
+    return '0' if result == '-0' else result
+
+
+def _str(value):
+    value = str(value)
+    if len(value) == 0 or _WHITESPACE.match(value):
+        return '"{}"'.format(value.replace('"', '\\"'))
+    return value
+
+
+def _width(layer, width):
+    return _num(width if width is not None
+                else DEFAULT_LAYER_WIDTH.get(layer, DEFAULT_WIDTH))
+
+
+def _text(node):
+    if node.rotation:
+        at = f'(at {_num(node.at.x)} {_num(node.at.y)} {_num(node.rotation)})'
+    else:
+        at = f'(at {_num(node.at.x)} {_num(node.at.y)})'
+    hide = ' hide' if node.hide else ''
+    mirror = ' (justify mirror)' if node.mirror else ''
+    return (f'  (fp_text {_str(node.type)} {_str(node.text)} {at} '
+            f'(layer {_str(node.layer)}){hide}\n'
+            f'    (effects (font (size {_num(node.size.x)} {_num(node.size.y)}) '
+            f'(thickness {_num(node.thickness)})){mirror})\n'
+            f'  )\n')
+
+
+def _arc(node):
+    return (f'  (fp_arc (start {_num(node.center_pos.x)} {_num(node.center_pos.y)}) '
+            f'(end {_num(node.start_pos.x)} {_num(node.start_pos.y)}) '
+            f'(angle {_num(node.angle)}) (layer {_str(node.layer)}) '
+            f'(width {_width(node.layer, node.width)}))\n')
+
+
+def _circle(node):
+    return (f'  (fp_circle (center {_num(node.center_pos.x)} {_num(node.center_pos.y)}) '
+            f'(end {_num(node.center_pos.x + node.radius)} {_num(node.center_pos.y)}) '
+            f'(layer {_str(node.layer)}) (width {_width(node.layer, node.width)}))\n')
+
+
+def _line(node):
+    return (f'  (fp_line (start {_num(node.start_pos.x)} {_num(node.start_pos.y)}) '
+            f'(end {_num(node.end_pos.x)} {_num(node.end_pos.y)}) '
+            f'(layer {_str(node.layer)}) (width {_width(node.layer, node.width)}))\n')
+
+
+def _polygon(node):
+    points = ''
+    for i, n in enumerate(node.nodes):
+        if i and i % 4 == 0:
+            points += '\n    '
+        points += f' (xy {_num(n.x)} {_num(n.y)})'
+    return (f'  (fp_poly (pts{points}) (layer {_str(node.layer)}) '
+            f'(width {_width(node.layer, node.width)}))\n')
+
+
+def _pad(node):
+    if node.shape == Pad.SHAPE_CUSTOM:
+        raise NotImplementedError('custom pads are not supported')
+
+    sexpr = f'  (pad {_str(node.number)} {_str(node.type)} {_str(node.shape)}'
+
+    if node.rotation % 360 != 0:
+        sexpr += f' (at {_num(node.at.x)} {_num(node.at.y)} {_num(node.rotation)})'
+    else:
+        sexpr += f' (at {_num(node.at.x)} {_num(node.at.y)})'
+
+    sexpr += f' (size {_num(node.size.x)} {_num(node.size.y)})'
+
+    if node.type in [Pad.TYPE_THT, Pad.TYPE_NPTH]:
+        if node.drill.x == node.drill.y:
+            sexpr += f' (drill {_num(node.drill.x)}'
+        else:
+            sexpr += f' (drill oval {_num(node.drill.x)} {_num(node.drill.y)}'
+        if node.offset.x != 0 or node.offset.y != 0:
+            sexpr += f' (offset {_num(node.offset.x)} {_num(node.offset.y)})'
+        sexpr += ')'
+
+    sexpr += ' (layers ' + ' '.join(map(_str, node.layers)) + ')'
+
+    if node.shape == Pad.SHAPE_ROUNDRECT:
+        sexpr += f' (roundrect_rratio {_num(node.radius_ratio)})'
+
+    margins = []
+    if node.solder_mask_margin != 0:
+        margins.append(f'(solder_mask_margin {_num(node.solder_mask_margin)})')
+    if node.solder_paste_margin_ratio != 0:
+        margins.append(f'(solder_paste_margin_ratio {_num(node.solder_paste_margin_ratio)})')
+    if node.solder_paste_margin != 0:
+        margins.append(f'(solder_paste_margin {_num(node.solder_paste_margin)})')
+    if margins:
+        sexpr += '\n    ' + ' '.join(margins)
+
+    return sexpr + ')\n'
+
+
+def _model(node):
+    return (f'  (model {_str(node.filename)}\n'
+            f'    (at (xyz {_num(node.at.x)} {_num(node.at.y)} {_num(node.at.z)}))\n'
+            f'    (scale (xyz {_num(node.scale.x)} {_num(node.scale.y)} {_num(node.scale.z)}))\n'
+            f'    (rotate (xyz {_num(node.rotate.x)} {_num(node.rotate.y)} {_num(node.rotate.z)}))\n'
+            f'  )\n')
+
+
+_SERIALIZERS = {
+    'Arc': _arc,
+    'Circle': _circle,
+    'Line': _line,
+    'Pad': _pad,
+    'Polygon': _polygon,
+    'Text': _text,
+    'Model': _model,
+}
+
+
+class SwitchFileHandler(FileHandler):
+    # Writes Switch footprints in the same format, byte for byte, as
+    # KicadModTree's KicadFileHandler, straight to a text stream. Like
+    # KicadFileHandler.serialize() the output ends with the closing
+    # parenthesis, writeFile() adds the newline the library files end with.
+    #
+    # Switch footprints are flat, they never contain Translation or Rotation
+    # nodes, so node coordinates are written as is instead of resolving them
+    # through getRealPosition, finding either raises NotImplementedError.
+
+    def __init__(self, kicad_mod):
+        FileHandler.__init__(self, kicad_mod)
+
+    def write(self, stream, timestamp=None):
+        footprint = self.kicad_mod
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        stream.write(f'(module {_str(footprint.name)} (layer F.Cu) '
+                     f'(tedit {int(timestamp):X})\n')
+
+        if footprint.description:
+            stream.write(f'  (descr {_str(footprint.description)})\n')
+        if footprint.tags:
+            stream.write(f'  (tags {_str(footprint.tags)})\n')
+        if footprint.attribute:
+            stream.write(f'  (attr {_str(footprint.attribute)})\n')
+        if footprint.maskMargin:
+            stream.write(f'  (solder_mask_margin {_num(footprint.maskMargin)})\n')
+        if footprint.pasteMargin:
+            stream.write(f'  (solder_paste_margin {_num(footprint.pasteMargin)})\n')
+        if footprint.pasteMarginRatio:
+            stream.write(f'  (solder_paste_ratio {_num(footprint.pasteMarginRatio)})\n')
+
+        for node_type, node in self.nodes():
+            stream.write(_SERIALIZERS[node_type](node))
+
+        stream.write(')')
+
+    def nodes(self):
+        # (node type, node) of every rendered node, in KicadFileHandler order.
+        # Same pre-order walk as Node.serialize(), collecting nodes per class.
+        # Shared geometry is walked as is (pads are PadGeometry), the nodes
+        # are only read.
+        grouped = {}
+        stack = [iter([self.kicad_mod])]
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+                continue
+
+            node_type = 'Pad' if isinstance(node, PadGeometry) \
+                else node.__class__.__name__
+            if node_type in _SERIALIZERS:
+                key = node_type
+                if node_type == 'Text' and node.type in ['reference', 'value']:
+                    key = node.type
+                grouped.setdefault(key, []).append((node_type, node))
+            elif node_type in ['Translation', 'Rotation']:
+                raise NotImplementedError(f'{node_type} nodes are not supported')
+
+            stack.append(iter(shared_childs(node)))
+
+        for key in ['reference', 'value'] + _BASE_NODES + ['Model']:
+            yield from grouped.get(key, [])
+
+    def serialize(self, **kwargs):
+        stream = io.StringIO()
+        self.write(stream, timestamp=kwargs.get('timestamp'))
+        return stream.getvalue()
+
+    def writeFile(self, filename, **kwargs):
+        with io.open(filename, 'w', newline='\n') as f:
+            self.write(f, timestamp=kwargs.get('timestamp'))
+            f.write('\n')
@@ -0,0 +1,101 @@
+from sexpr import parse
+
+# items matched by kind, the label helps to tell which one changed
+_KINDS = ['descr', 'tags', 'attr', 'fp_text', 'fp_line', 'fp_arc',
+          'fp_circle', 'fp_poly', 'pad', 'model']
+
+
+def _number(atom):
+    try:
+        return float(atom)
+    except ValueError:
+        return None
+
+
+def equal(a, b, tolerance):
+    # structural equality, numbers are compared with an absolute tolerance
+    if isinstance(a, list) or isinstance(b, list):
+        return (isinstance(a, list) and isinstance(b, list) and
+                len(a) == len(b) and
+                all(equal(x, y, tolerance) for x, y in zip(a, b)))
+    if a == b:
+        return True
+    x, y = _number(a), _number(b)
+    return x is not None and y is not None and abs(x - y) <= tolerance
+
+
+def _field(item, name):
+    for child in item[1:]:
+        if isinstance(child, list) and child and child[0] == name:
+            return child
+    return None
+
+
+def _format(item):
+    if isinstance(item, list):
+        return '(' + ' '.join(map(_format, item)) + ')'
+    return item if item and ' ' not in item else f'"{item}"'
+
+
+def _label(item):
+    kind = item[0]
+    layer = _field(item, 'layer') or _field(item, 'layers')
+    layer = ' '.join(layer[1:]) if layer else ''
+    if kind == 'pad':
+        at = _field(item, 'at')
+        return f'pad {_format(item[1])} {item[2]} {_format(at)} [{layer}]'
+    if kind == 'fp_text':
+        return f'fp_text {item[1]} {_format(item[2])} [{layer}]'
+    if kind in ['fp_line', 'fp_arc', 'fp_circle']:
+        points = ' '.join(_format(c) for c in item[1:3])
+        return f'{kind} {points} [{layer}]'
+    if kind == 'model':
+        return f'model {item[1]}'
+    return _format(item)
+
+
+def _layers(item):
+    layer = _field(item, 'layer') or _field(item, 'layers')
+    return layer[1:] if layer else []
+
+
+def diff(reference, generated, tolerance=0.0005):
+    # Compares two .kicad_mod texts structurally, ignoring item order within
+    # a kind. Returns a list of lines describing the differences, empty when
+    # both describe the same footprint.
+    ref, gen = parse(reference), parse(generated)
+    lines = []
+
+    if ref[:2] != gen[:2]:
+        lines.append(f'name: {_format(ref[1])} -> {_format(gen[1])}')
+
+    layers = set()
+    for kind in _KINDS:
+        removed = [i for i in ref[2:] if isinstance(i, list) and i[0] == kind]
+        added = [i for i in gen[2:] if isinstance(i, list) and i[0] == kind]
+
+        for item in list(removed):
+            for other in added:
+                if equal(item, other, tolerance):
+                    removed.remove(item)
+                    added.remove(other)
+                    break
+
+        for item in removed:
+            lines.append(f'- {_label(item)}')
+            layers.update(_layers(item))
+        for item in added:
+            lines.append(f'+ {_label(item)}')
+            layers.update(_layers(item))
+
+    other = set(i[0] for i in ref[2:] + gen[2:] if isinstance(i, list))
+    for kind in sorted(other - set(_KINDS)):
+        a = [i for i in ref[2:] if isinstance(i, list) and i[0] == kind]
+        b = [i for i in gen[2:] if isinstance(i, list) and i[0] == kind]
+        if not equal(a, b, tolerance):
+            lines.append(f'~ {kind}')
+
+    if layers:
+        lines.append('layers: ' + ' '.join(sorted(layers)))
+
+    return lines
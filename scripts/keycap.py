@@ -1,4 +1,7 @@
 
+from copy import deepcopy
+from functools import lru_cache
+
 from KicadModTree.Vector import Vector2D
 from KicadModTree.nodes.Node import Node
 from KicadModTree.nodes.specialized import RectLine, PolygoneLine
@@ -27,72 +30,95 @@ class Keycap(Node):
         self.x_offset = x_offset
         self.y_offset = y_offset
 
-        if keycap_type == 'regular':
-            self.virtual_childs = self._init_regular_keycap()
-        elif keycap_type == 'ISOEnter':
-            self.virtual_childs = self._init_ISOEnter_keycap()
-        else:
-            raise Exception('Keycap type not supported')
-
-    def _init_regular_keycap(self):
-
-        nodes = []
-
-        if self.width is None:
-            raise Exception('Keycap width not specified')
-
-        self.tags = f'{self.width:1.2f}u'
-        if self.rotation != 0:
-            self.tags += f' {self.rotation}deg'
-        if self.x_offset != 0 or self.y_offset != 0:
-            self.tags += ' Offset'
+        self.tags, self.virtual_childs = keycap_outline(
+            keycap_type, self.x_spacing, self.y_spacing,
+            width, rotation, x_offset, y_offset)
         self.name = self.tags.replace(' ', '_')
 
-        start = Vector2D(-(self.x_spacing * self.width)/2 + self.x_offset,
-                         -self.y_spacing/2 + self.y_offset)
-        end = Vector2D((self.x_spacing * self.width)/2 + self.x_offset,
-                       self.y_spacing/2 + self.y_offset)
-
-        if self.rotation:
-            start = start.rotate(self.rotation)
-            end = end.rotate(self.rotation)
-
-        nodes.append(RectLine(start=start, end=end,
-                     layer='Dwgs.User', width=0.1))
-
-        return nodes
-
-    def _init_ISOEnter_keycap(self):
-        nodes = []
+    def getVirtualChilds(self):
+        return deepcopy(list(self.virtual_childs))
 
-        self.tags = 'ISOEnter'
-        if self.rotation != 0:
-            self.tags += f' {self.rotation}deg'
-        self.name = self.tags.replace(' ', '_')
+    def getSharedChilds(self):
+        return self.virtual_childs
 
-        polyline = [Vector2D((self.x_spacing*1.25)/2 + self.x_offset,
-                             self.y_spacing + self.y_offset),
-                    Vector2D((self.x_spacing*1.25)/2 + self.x_offset,
-                             -self.y_spacing + self.y_offset),
-                    Vector2D(-(self.x_spacing*1.75)/2 + self.x_offset,
-                             -self.y_spacing + self.y_offset),
-                    Vector2D(-(self.x_spacing*1.75)/2 + self.x_offset,
-                             0 + self.y_offset),
-                    Vector2D(-(self.x_spacing*1.25)/2 + self.x_offset,
-                             0 + self.y_offset),
-                    Vector2D(-(self.x_spacing*1.25)/2 + self.x_offset,
-                             self.y_spacing + self.y_offset),
-                    Vector2D((self.x_spacing*1.25)/2 + self.x_offset,
-                             self.y_spacing + self.y_offset)]
-
-        if self.rotation:
-            for point in polyline:
-                point = point.rotate(self.rotation)
-
-        nodes.append(PolygoneLine(polygone=polyline,
-                                  layer='Dwgs.User', width=0.1))
-
-        return nodes
 
-    def getVirtualChilds(self):
-        return self.virtual_childs
+# Keycap outlines only depend on these parameters and are the same for every
+# switch family using the same spacing, so they are built once and shared.
+# The returned nodes are never appended to a parent and only read through
+# Keycap.getSharedChilds(), Keycap.getVirtualChilds() copies them.
+# The cache is typed because 90 and 90.0 give different tags.
+@lru_cache(maxsize=1024, typed=True)
+def keycap_outline(keycap_type: str, x_spacing: float, y_spacing: float,
+                   width: float = None, rotation: float = 0,
+                   x_offset: float = 0, y_offset: float = 0):
+
+    if keycap_type == 'regular':
+        return _regular_keycap_outline(x_spacing, y_spacing, width,
+                                       rotation, x_offset, y_offset)
+    elif keycap_type == 'ISOEnter':
+        return _ISOEnter_keycap_outline(x_spacing, y_spacing,
+                                        rotation, x_offset, y_offset)
+    else:
+        raise Exception('Keycap type not supported')
+
+
+def _regular_keycap_outline(x_spacing, y_spacing, width,
+                            rotation, x_offset, y_offset):
+
+    nodes = []
+
+    if width is None:
+        raise Exception('Keycap width not specified')
+
+    tags = f'{width:1.2f}u'
+    if rotation != 0:
+        tags += f' {rotation}deg'
+    if x_offset != 0 or y_offset != 0:
+        tags += ' Offset'
+
+    start = Vector2D(-(x_spacing * width)/2 + x_offset,
+                     -y_spacing/2 + y_offset)
+    end = Vector2D((x_spacing * width)/2 + x_offset,
+                   y_spacing/2 + y_offset)
+
+    if rotation:
+        start = start.rotate(rotation)
+        end = end.rotate(rotation)
+
+    nodes.append(RectLine(start=start, end=end,
+                 layer='Dwgs.User', width=0.1))
+
+    return tags, tuple(nodes)
+
+
+def _ISOEnter_keycap_outline(x_spacing, y_spacing,
+                             rotation, x_offset, y_offset):
+    nodes = []
+
+    tags = 'ISOEnter'
+    if rotation != 0:
+        tags += f' {rotation}deg'
+
+    polyline = [Vector2D((x_spacing*1.25)/2 + x_offset,
+                         y_spacing + y_offset),
+                Vector2D((x_spacing*1.25)/2 + x_offset,
+                         -y_spacing + y_offset),
+                Vector2D(-(x_spacing*1.75)/2 + x_offset,
+                         -y_spacing + y_offset),
+                Vector2D(-(x_spacing*1.75)/2 + x_offset,
+                         0 + y_offset),
+                Vector2D(-(x_spacing*1.25)/2 + x_offset,
+                         0 + y_offset),
+                Vector2D(-(x_spacing*1.25)/2 + x_offset,
+                         y_spacing + y_offset),
+                Vector2D((x_spacing*1.25)/2 + x_offset,
+                         y_spacing + y_offset)]
+
+    if rotation:
+        for point in polyline:
+            point = point.rotate(rotation)
+
+    nodes.append(PolygoneLine(polygone=polyline,
+                              layer='Dwgs.User', width=0.1))
+
+    return tags, tuple(nodes)
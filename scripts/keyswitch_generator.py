@@ -1,10 +1,21 @@
 import argparse
+import cProfile
+import itertools
+import multiprocessing
 import os
+import sys
+from contextlib import contextmanager
+from functools import lru_cache, partial
 
-from KicadModTree.KicadFileHandler import KicadFileHandler
+import drc
+import footprint_diff
 
+from emitter import SwitchFileHandler
 from keycap import Keycap
 
+from manifest import Manifest, inputs_digest, output_digest, file_digest
+from profiling import FootprintTimer, Profile
+
 from switch import StabilizerCherryMX, SwitchAlpsMatias, SwitchCherryMX, \
                    SwitchHybridCherryMxAlps, SwitchKailhChoc, \
                    SwitchHotswapKailh, SwitchKailhKH, \
@@ -47,263 +58,251 @@ keycaps = {
 }
 
 
-def generate_stabilizer_cherry_mx(output_path):
-    group = 'Mounting_Keyboard_Stabilizer'
-    out_path = os.path.join(output_path, f'{group}.pretty')
-    if not os.path.isdir(out_path):
-        os.mkdir(out_path)
-    sizes = [2, 3, 6, 6.25, 7, 8]
-    for size in sizes:
-        stab = StabilizerCherryMX(size=size, path3d=path3d)
-        file_handler = KicadFileHandler(stab)
-        file_handler.writeFile(os.path.join(out_path, f'{stab.name}.kicad_mod'), timestamp=0)
-
-
-def generate_switch_alps_matias(output_path):
-    spacing = 19.05
-    group = 'Switch_Keyboard_Alps_Matias'
-    out_path = os.path.join(output_path, f'{group}.pretty')
-    if not os.path.isdir(out_path):
-        os.mkdir(out_path)
-    keys = ['1u', '1.25u', '1.5u', '1.75u', '2u', '2.25u', '2.5u', '2.75u',
-            '3u', '4u', '4.5u', '5.5u', '6u', '6.25u', '6.5u', '7u',
-            'ISOEnter']
-
-    switches = []
-
-    switches.append(SwitchAlpsMatias(path3d=path3d))
-
-    for key in keys:
-        switches.append(SwitchAlpsMatias(path3d=path3d,
-                                         keycap=Keycap(spacing=spacing,
-                                                       **keycaps[key])))
-
-    for switch in switches:
-        file_handler = KicadFileHandler(switch)
-        file_handler.writeFile(os.path.join(out_path, f'{switch.name}.kicad_mod'), timestamp=0)
-
-
-def generate_switch_cherry_mx(output_path):
-    spacing = 19.05
-    group = 'Switch_Keyboard_Cherry_MX'
-    out_path = os.path.join(output_path, f'{group}.pretty')
-    if not os.path.isdir(out_path):
-        os.mkdir(out_path)
-    keys = ['1u', '1.25u', '1.25u90', '1.5u', '1.5u90', '1.75u', '1.75u90',
-            '2u', '2u90', '2.25u', '2.25u90', '2.5u', '2.5u90', '2.75u',
-            '2.75u90', '3u', '3u90', '4u', '4.5u', '5.5u', '6u', '6uOffset',
-            '6.25u', '6.5u', '7u', 'ISOEnter', 'ISOEnter90', 'ISOEnter180',
-            'ISOEnter270']
-
-    switches = []
-
-    for switch_type in ['PCB', 'Plate']:
-        switches.append(SwitchCherryMX(switch_type=switch_type, path3d=path3d))
-
-        for key in keys:
-            switches.append(SwitchCherryMX(switch_type=switch_type,
-                                           path3d=path3d,
-                                           keycap=Keycap(spacing=spacing,
-                                                         **keycaps[key])))
-
-    for switch in switches:
-        file_handler = KicadFileHandler(switch)
-        file_handler.writeFile(os.path.join(out_path, f'{switch.name}.kicad_mod'), timestamp=0)
-
-
-def generate_switch_hybrid_cherry_mx_alps(output_path):
-    spacing = 19.05
-    group = 'Switch_Keyboard_Hybrid'
-    out_path = os.path.join(output_path, f'{group}.pretty')
-    if not os.path.isdir(out_path):
-        os.mkdir(out_path)
-    keys = ['1u', '1.25u', '1.5u', '1.75u', '2u', '2.25u', '2.5u', '2.75u',
-            '3u', '4u', '4.5u', '5.5u', '6u', '6.25u', '6.5u', '7u',
-            'ISOEnter']
-
-    switches = []
-
-    switches.append(SwitchHybridCherryMxAlps(path3d=path3d))
-
-    for key in keys:
-        switches.append(
-            SwitchHybridCherryMxAlps(path3d=path3d,
-                                     keycap=Keycap(spacing=spacing,
-                                                   **keycaps[key])))
-
-    for switch in switches:
-        file_handler = KicadFileHandler(switch)
-        file_handler.writeFile(os.path.join(out_path, f'{switch.name}.kicad_mod'), timestamp=0)
-
-
-def generate_switch_kailh_choc(output_path):
-    x_spacing = 18
-    y_spacing = 17
-    group = 'Switch_Keyboard_Kailh'
-    out_path = os.path.join(output_path, f'{group}.pretty')
-    if not os.path.isdir(out_path):
-        os.mkdir(out_path)
-    keys = ['1u', '1.25u', '1.25u90', '1.5u', '1.5u90', '1.75u', '1.75u90',
-            '2u', '2u90', '2.25u', '2.25u90', '2.5u', '2.5u90', '2.75u',
-            '2.75u90', '3u', '3u90', '4u', '4.5u', '5.5u', '6u', '6uOffset',
-            '6.25u', '6.5u', '7u', 'ISOEnter', 'ISOEnter90', 'ISOEnter180',
-            'ISOEnter270']
-
-    switches = []
-
-    for switch_type in ['V1', 'V2', 'V1V2']:
-        switches.append(SwitchKailhChoc(switch_type=switch_type,
-                                        path3d=path3d))
-
-        for key in keys:
-            switches.append(SwitchKailhChoc(switch_type=switch_type,
-                                            path3d=path3d,
-                                            keycap=Keycap(x_spacing=x_spacing,
-                                                          y_spacing=y_spacing,
-                                                          **keycaps[key])))
-
-    for switch in switches:
-        file_handler = KicadFileHandler(switch)
-        file_handler.writeFile(os.path.join(out_path, f'{switch.name}.kicad_mod'), timestamp=0)
-
-
-def generate_switch_kailh_choc_mini(output_path):
-    x_spacing = 18
-    y_spacing = 17
-    group = 'Switch_Keyboard_Kailh'
-    out_path = os.path.join(output_path, f'{group}.pretty')
-    if not os.path.isdir(out_path):
-        os.mkdir(out_path)
-    keys = ['1u', '1.25u', '1.25u90', '1.5u', '1.5u90', '1.75u', '1.75u90',
-            '2u', '2u90', '2.25u', '2.25u90', '2.5u', '2.5u90', '2.75u',
-            '2.75u90', '3u', '3u90', '4u', '4.5u', '5.5u', '6u', '6uOffset',
-            '6.25u', '6.5u', '7u', 'ISOEnter', 'ISOEnter90', 'ISOEnter180',
-            'ISOEnter270']
-
-    switches = []
-
-    switches.append(SwitchKailhChocMini(path3d=path3d))
-
-    for key in keys:
-        switches.append(SwitchKailhChocMini(path3d=path3d,
-                                          keycap=Keycap(x_spacing=x_spacing,
-                                                        y_spacing=y_spacing,
-                                                        **keycaps[key])))
-
-    for switch in switches:
-        file_handler = KicadFileHandler(switch)
-        file_handler.writeFile(os.path.join(out_path, f'{switch.name}.kicad_mod'), timestamp=0)
-
-
-def generate_switch_kailh_kh(output_path):
-    spacing = 19.05
-    group = 'Switch_Keyboard_Kailh'
-    out_path = os.path.join(output_path, f'{group}.pretty')
-    if not os.path.isdir(out_path):
-        os.mkdir(out_path)
-    keys = ['1u', '1.25u', '1.25u90', '1.5u', '1.5u90', '1.75u', '1.75u90',
-            '2u', '2u90', '2.25u', '2.25u90', '2.5u', '2.5u90', '2.75u',
-            '2.75u90', '3u', '3u90', '4u', '4.5u', '5.5u', '6u', '6uOffset',
-            '6.25u', '6.5u', '7u', 'ISOEnter', 'ISOEnter90', 'ISOEnter180',
-            'ISOEnter270']
-
-    switches = []
-
-    switches.append(SwitchKailhKH(path3d=path3d))
-
-    for key in keys:
-        switches.append(SwitchKailhKH(path3d=path3d,
-                                      keycap=Keycap(spacing=spacing,
-                                                    **keycaps[key])))
-
-    for switch in switches:
-        file_handler = KicadFileHandler(switch)
-        file_handler.writeFile(os.path.join(out_path, f'{switch.name}.kicad_mod'), timestamp=0)
-
-
-def generate_switch_kailh_nb(output_path):
-    spacing = 19.05
-    group = 'Switch_Keyboard_Kailh'
-    out_path = os.path.join(output_path, f'{group}.pretty')
-    if not os.path.isdir(out_path):
-        os.mkdir(out_path)
-    keys = ['1u', '1.25u', '1.5u', '1.75u', '2u', '2.25u', '2.5u', '2.75u',
-            '3u', '4u', '4.5u', '5.5u', '6u', '6.25u', '6.5u', '7u',
-            'ISOEnter']
-
-    switches = []
-
-    switches.append(SwitchKailhNB(path3d=path3d))
-
-    for key in keys:
-        switches.append(SwitchKailhNB(path3d=path3d,
-                                      keycap=Keycap(spacing=spacing,
-                                                    **keycaps[key])))
-
-    for switch in switches:
-        file_handler = KicadFileHandler(switch)
-        file_handler.writeFile(os.path.join(out_path, f'{switch.name}.kicad_mod'), timestamp=0)
-
-
-def generate_switch_hotswap_kailh(output_path):
-    spacing = 19.05
-    group = 'Switch_Keyboard_Hotswap_Kailh'
-    out_path = os.path.join(output_path, f'{group}.pretty')
-    if not os.path.isdir(out_path):
-        os.mkdir(out_path)
-    keys = ['1u', '1.25u', '1.25u90', '1.5u', '1.5u90', '1.75u', '1.75u90',
-            '2u', '2u90', '2.25u', '2.25u90', '2.5u', '2.5u90', '2.75u',
-            '2.75u90', '3u', '3u90', '4u', '4.5u', '5.5u', '6u', '6uOffset',
-            '6.25u', '6.5u', '7u', 'ISOEnter', 'ISOEnter90', 'ISOEnter180',
-            'ISOEnter270']
-
-    switches = []
-
-    for plated in [False, True]:
-
-        switches.append(SwitchHotswapKailh(path3d=path3d, hotswap_plated=plated))
-
-        for key in keys:
-            switches.append(SwitchHotswapKailh(path3d=path3d,
-                                               hotswap_plated=plated,
-                                               keycap=Keycap(spacing=spacing,
-                                                             **keycaps[key])))
-
-    for switch in switches:
-        file_handler = KicadFileHandler(switch)
-        file_handler.writeFile(os.path.join(out_path, f'{switch.name}.kicad_mod'), timestamp=0)
-
-
-def generate_switch_hotswap_kailh_choc(output_path):
-    x_spacing = 18
-    y_spacing = 17
-    group = 'Switch_Keyboard_Hotswap_Kailh'
-    out_path = os.path.join(output_path, f'{group}.pretty')
-    if not os.path.isdir(out_path):
-        os.mkdir(out_path)
-    keys = ['1u', '1.25u', '1.25u90', '1.5u', '1.5u90', '1.75u', '1.75u90',
-            '2u', '2u90', '2.25u', '2.25u90', '2.5u', '2.5u90', '2.75u',
-            '2.75u90', '3u', '3u90', '4u', '4.5u', '5.5u', '6u', '6uOffset',
-            '6.25u', '6.5u', '7u', 'ISOEnter', 'ISOEnter90', 'ISOEnter180',
-            'ISOEnter270']
-
-    switches = []
+keys_basic = ['1u', '1.25u', '1.5u', '1.75u', '2u', '2.25u', '2.5u', '2.75u',
+              '3u', '4u', '4.5u', '5.5u', '6u', '6.25u', '6.5u', '7u',
+              'ISOEnter']
+
+keys_full = ['1u', '1.25u', '1.25u90', '1.5u', '1.5u90', '1.75u', '1.75u90',
+             '2u', '2u90', '2.25u', '2.25u90', '2.5u', '2.5u90', '2.75u',
+             '2.75u90', '3u', '3u90', '4u', '4.5u', '5.5u', '6u', '6uOffset',
+             '6.25u', '6.5u', '7u', 'ISOEnter', 'ISOEnter90', 'ISOEnter180',
+             'ISOEnter270']
+
+mx_spacing = {'spacing': 19.05}
+choc_spacing = {'x_spacing': 18, 'y_spacing': 17}
+
+# Every footprint in the library, per output group. Each combination of the
+# parameter axes gives a footprint without keycap, followed by one footprint
+# per keycap in keys.
+footprint_specs = [
+    {'group': 'Mounting_Keyboard_Stabilizer', 'class': StabilizerCherryMX,
+     'axes': {'size': [2, 3, 6, 6.25, 7, 8]}},
+    {'group': 'Switch_Keyboard_Alps_Matias', 'class': SwitchAlpsMatias,
+     'keys': keys_basic, 'spacing': mx_spacing},
+    {'group': 'Switch_Keyboard_Cherry_MX', 'class': SwitchCherryMX,
+     'axes': {'switch_type': ['PCB', 'Plate']},
+     'keys': keys_full, 'spacing': mx_spacing},
+    {'group': 'Switch_Keyboard_Hybrid', 'class': SwitchHybridCherryMxAlps,
+     'keys': keys_basic, 'spacing': mx_spacing},
+    {'group': 'Switch_Keyboard_Kailh', 'class': SwitchKailhChoc,
+     'axes': {'switch_type': ['V1', 'V2', 'V1V2']},
+     'keys': keys_full, 'spacing': choc_spacing},
+    {'group': 'Switch_Keyboard_Hotswap_Kailh', 'class': SwitchKailhChoc,
+     'axes': {'hotswap': [True], 'hotswap_plated': [False, True]},
+     'keys': keys_full, 'spacing': choc_spacing},
+    {'group': 'Switch_Keyboard_Kailh', 'class': SwitchKailhChocMini,
+     'keys': keys_full, 'spacing': choc_spacing},
+    {'group': 'Switch_Keyboard_Kailh', 'class': SwitchKailhKH,
+     'keys': keys_full, 'spacing': mx_spacing},
+    {'group': 'Switch_Keyboard_Kailh', 'class': SwitchKailhNB,
+     'keys': keys_basic, 'spacing': mx_spacing},
+    {'group': 'Switch_Keyboard_Hotswap_Kailh', 'class': SwitchHotswapKailh,
+     'axes': {'hotswap_plated': [False, True]},
+     'keys': keys_full, 'spacing': mx_spacing},
+]
+
+
+def plan(specs=footprint_specs, groups=None, classes=None, keys=None,
+         model3d_ext=None, model3d_suffix=None):
+    # Lazily expand specs into variants, picklable descriptions of one
+    # footprint: (group, switch class, constructor kwargs, keycap kwargs).
+    # groups, classes and keys optionally restrict the plan, the keycap key
+    # 'none' selects footprints without keycap. model3d_ext replaces the
+    # extension of the 3D models, model3d_suffix is added to their names.
+    for spec in specs:
+        if groups is not None and spec['group'] not in groups:
+            continue
+        if classes is not None and spec['class'].__name__ not in classes:
+            continue
+
+        axes = spec.get('axes', {})
+        for values in itertools.product(*axes.values()):
+            kwargs = dict(zip(axes, values))
+            if model3d_ext is not None:
+                kwargs['model3d_ext'] = model3d_ext
+            if model3d_suffix is not None:
+                kwargs['model3d_suffix'] = model3d_suffix
+
+            if keys is None or 'none' in keys:
+                yield spec['group'], spec['class'], kwargs, None
+
+            for key in spec.get('keys', []):
+                if keys is not None and key not in keys:
+                    continue
+                yield (spec['group'], spec['class'], kwargs,
+                       dict(spec['spacing'], **keycaps[key]))
+
+
+# Switch without keycap per class and parameters, the footprints of a
+# family are derived from it instead of being built from scratch. The
+# library has about 20 families, the cache is bounded for long running users
+# placing many different switches.
+@lru_cache(maxsize=64)
+def _prototype(cls, kwargs):
+    return cls(path3d=path3d, **dict(kwargs))
+
+
+def build_footprint(variant, lazy=False):
+    # a lazy footprint only has its name and other metadata until its nodes
+    # are walked, the others are derived from the prototype of their class
+    # and parameters
+    group, cls, kwargs, keycap = variant
+    keycap = Keycap(**keycap) if keycap is not None else None
+    if lazy:
+        return cls(path3d=path3d, lazy=lazy, keycap=keycap, **kwargs)
+
+    return _prototype(cls, tuple(sorted(kwargs.items()))).derive(keycap)
+
+
+# design rule violations per switch class and parameters, keycaps only add
+# Dwgs.User drawings and do not change them
+_violations = {}
+
+
+def check_footprint_rules(variant, switch):
+    if drc.np is None:
+        return []
+    key = (variant[1], repr(sorted(variant[2].items())))
+    if key not in _violations:
+        _violations[key] = drc.check(switch)
+    return _violations[key]
+
+
+def write_footprint(output_path, variant, profile=False):
+    timer = FootprintTimer() if profile else None
+
+    switch = build_footprint(variant)
+    if timer:
+        timer.lap('build')
+
+    violations = check_footprint_rules(variant, switch)
+    if timer:
+        timer.lap('check')
+
+    out_path = os.path.join(output_path, f'{variant[0]}.pretty')
+    filename = os.path.join(out_path, f'{switch.name}.kicad_mod')
+    output = (SwitchFileHandler(switch).serialize(timestamp=0) + '\n').encode()
+    out_digest = output_digest(output)
+    if timer:
+        timer.lap('serialize')
+
+    # leave files (and their mtime) alone when the bytes did not change
+    changed = file_digest(filename) != out_digest
+
+    # several generators share a .pretty directory, write through a
+    # temporary file so concurrent workers never see a partial footprint
+    if changed:
+        tmp_filename = f'{filename}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_filename, 'wb') as f:
+                f.write(output)
+            os.replace(tmp_filename, filename)
+        except BaseException:
+            if os.path.exists(tmp_filename):
+                os.unlink(tmp_filename)
+            raise
+
+    stats = None
+    if timer:
+        timer.lap('write')
+        stats = timer.finish(switch, len(output) if changed else 0)
+
+    return filename, out_digest, changed, violations, stats
+
+
+def _write_footprint_task(task):
+    digest, output_path, variant, profile = task
+    return digest, variant[0], write_footprint(output_path, variant, profile)
+
+
+def _plan_tasks(output_path, variants, manifest, profile):
+    groups = set()
+    for variant in variants:
+        if variant[0] not in groups:
+            groups.add(variant[0])
+            os.makedirs(os.path.join(output_path, f'{variant[0]}.pretty'),
+                        exist_ok=True)
+
+        digest = inputs_digest(variant[1], variant[2], variant[3], path3d)
+        if manifest is not None and manifest.is_current(digest):
+            continue
+
+        yield digest, output_path, variant, profile is not None
+
+
+@contextmanager
+def _task_map(jobs):
+    # map() in-process, or an unordered map over a worker pool that is torn
+    # down even when a task or the caller raises
+    if jobs == 1:
+        yield map
+        return
+
+    with multiprocessing.Pool(jobs) as pool:
+        yield partial(pool.imap_unordered, chunksize=4)
+
+
+def write_footprints(output_path, variants, jobs=1, manifest=None,
+                     profile=None):
+    # Returns the written footprints and {footprint: [violations]} of every
+    # footprint failing the design rules, including the ones the manifest
+    # skipped.
+    tasks = _plan_tasks(output_path, variants, manifest, profile)
+
+    written = []
+    violations = {}
+    with _task_map(jobs) as task_map:
+        for digest, group, (filename, out_digest, changed, messages,
+                            stats) in task_map(_write_footprint_task, tasks):
+            if manifest is not None:
+                manifest.update(digest, filename, out_digest, messages)
+            elif messages:
+                violations[os.path.relpath(filename, output_path)] = messages
+            if profile is not None:
+                profile.add(group, os.path.relpath(filename, output_path),
+                            stats)
+            if changed:
+                written.append(filename)
+
+    if manifest is not None:
+        violations = manifest.violations()
+
+    return written, violations
 
-    for plated in [False, True]:
-
-        switches.append(SwitchKailhChoc(path3d=path3d, hotswap=True,
-                                        hotswap_plated=plated))
 
-        for key in keys:
-            switches.append(SwitchKailhChoc(path3d=path3d, hotswap=True,
-                                            hotswap_plated=plated,
-                                            keycap=Keycap(x_spacing=x_spacing,
-                                                          y_spacing=y_spacing,
-                                                          **keycaps[key])))
+def check_footprint(reference_path, variant, tolerance):
+    switch = build_footprint(variant)
+    name = f'{variant[0]}.pretty/{switch.name}.kicad_mod'
+    output = SwitchFileHandler(switch).serialize(timestamp=0) + '\n'
 
-    for switch in switches:
-        file_handler = KicadFileHandler(switch)
-        file_handler.writeFile(os.path.join(out_path, f'{switch.name}.kicad_mod'), timestamp=0)
+    try:
+        with open(os.path.join(reference_path, name)) as f:
+            reference = f.read()
+    except FileNotFoundError:
+        return name, ['missing in reference']
+
+    if reference == output:
+        return name, []
+
+    return name, footprint_diff.diff(reference, output, tolerance)
+
+
+def _check_footprint_task(task):
+    return check_footprint(*task)
+
+
+def check_footprints(reference_path, variants, jobs=1, tolerance=0.0005):
+    # Builds footprints in memory and compares them structurally with the
+    # ones in reference_path. Returns {footprint: [differences]} for every
+    # footprint that drifted.
+    tasks = ((reference_path, variant, tolerance) for variant in variants)
+
+    with _task_map(jobs) as task_map:
+        return dict(task_map(_check_footprint_task, tasks))
+
+
+def _csv(value):
+    return value.split(',')
 
 
 if __name__ == '__main__':
@@ -317,18 +316,162 @@ if __name__ == '__main__':
                         help='output path '
                              '(default: %(default)s)')
 
+    parser.add_argument('-j', '--jobs',
+                        type=int, default=1,
+                        help='number of worker processes, 0 uses all cores '
+                             '(default: %(default)s)')
+
+    parser.add_argument('-f', '--force',
+                        action='store_true',
+                        help='rebuild every footprint, ignoring the manifest')
+
+    parser.add_argument('--prune',
+                        action='store_true',
+                        help='delete footprints that are no longer generated')
+
+    parser.add_argument('-p', '--profile',
+                        type=str, default=None,
+                        help='write a JSON timing, node count and memory '
+                             'report of the run to this file, combine with '
+                             '--force to profile every footprint')
+
+    parser.add_argument('--cprofile',
+                        type=str, default=None,
+                        help='write cProfile stats of the run to this file, '
+                             'worker processes are not profiled')
+
+    parser.add_argument('--check',
+                        type=str, nargs='?', default=None,
+                        const=os.path.join(os.path.dirname(__file__), '..',
+                                           'library', 'footprints'),
+                        help='compare the generated footprints with a '
+                             'library instead of writing them, exits with '
+                             'status 1 on differences (default: the '
+                             'committed library)')
+
+    parser.add_argument('--tolerance',
+                        type=float, default=0.0005,
+                        help='tolerance of --check for numbers '
+                             '(default: %(default)s)')
+
+    parser.add_argument('-g', '--group',
+                        type=_csv, default=None,
+                        help='only generate these groups (comma separated), '
+                             'e.g. Switch_Keyboard_Cherry_MX')
+
+    parser.add_argument('-c', '--class',
+                        type=_csv, default=None, dest='classes',
+                        help='only generate these switch classes '
+                             '(comma separated), e.g. SwitchKailhChoc')
+
+    parser.add_argument('-k', '--keycap',
+                        type=_csv, default=None,
+                        help='only generate these keycaps (comma separated), '
+                             'e.g. 2.25u,ISOEnter, use none for footprints '
+                             'without keycap')
+
+    parser.add_argument('--strict',
+                        action='store_true',
+                        help='exit with status 1 when a footprint fails the '
+                             'design rule checks')
+
+    parser.add_argument('--model-format',
+                        type=str, choices=['wrl', 'wrz'], default='wrl',
+                        help='3D model files to reference, wrz for the '
+                             'models of vrml.py --wrz (default: %(default)s)')
+
+    parser.add_argument('--model-lod',
+                        action='store_true',
+                        help='reference the low detail _LOD models, '
+                             'rerun lod.py after changing the models')
+
+    parser.add_argument('-l', '--list',
+                        action='store_true',
+                        help='list the footprints that would be generated '
+                             'and exit')
+
     args = parser.parse_args()
 
+    for name, valid in [('group', set(s['group'] for s in footprint_specs)),
+                        ('classes', set(s['class'].__name__
+                                        for s in footprint_specs)),
+                        ('keycap', set(keycaps) | {'none'})]:
+        unknown = set(getattr(args, name) or []) - valid
+        if unknown:
+            parser.error(f'unknown {name}: {", ".join(sorted(unknown))}')
+
+    variants = plan(groups=args.group, classes=args.classes, keys=args.keycap,
+                    model3d_ext=None if args.model_format == 'wrl'
+                    else args.model_format,
+                    model3d_suffix='_LOD' if args.model_lod else None)
+    filtered = any([args.group, args.classes, args.keycap])
+
+    if args.list:
+        for variant in variants:
+            print(f'{variant[0]}.pretty/'
+                  f'{build_footprint(variant, lazy=True).name}')
+        sys.exit(0)
+
+    if args.check:
+        checked = check_footprints(args.check, variants,
+                                   jobs=args.jobs or os.cpu_count(),
+                                   tolerance=args.tolerance)
+
+        drift = {name: lines for name, lines in checked.items() if lines}
+        if not filtered:
+            for group in set(s['group'] for s in footprint_specs):
+                group_dir = os.path.join(args.check, f'{group}.pretty')
+                if not os.path.isdir(group_dir):
+                    continue
+                for name in os.listdir(group_dir):
+                    name = f'{group}.pretty/{name}'
+                    if name.endswith('.kicad_mod') and name not in checked:
+                        drift[name] = ['not generated']
+
+        for name in sorted(drift):
+            print(name)
+            for line in drift[name]:
+                print(f'  {line}')
+        print(f'{len(checked)} footprints checked, {len(drift)} differ')
+        sys.exit(1 if drift else 0)
+
     if not os.path.isdir(args.output):
         os.mkdir(args.output)
 
-    generate_stabilizer_cherry_mx(args.output)
-    generate_switch_alps_matias(args.output)
-    generate_switch_cherry_mx(args.output)
-    generate_switch_hybrid_cherry_mx_alps(args.output)
-    generate_switch_kailh_choc(args.output)
-    generate_switch_hotswap_kailh_choc(args.output)
-    generate_switch_kailh_choc_mini(args.output)
-    generate_switch_kailh_kh(args.output)
-    generate_switch_kailh_nb(args.output)
-    generate_switch_hotswap_kailh(args.output)
+    manifest = Manifest(args.output)
+    if args.force:
+        manifest.entries = {}
+
+    profile = Profile() if args.profile else None
+    if args.cprofile:
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+
+    written, violations = write_footprints(args.output, variants,
+                                           jobs=args.jobs or os.cpu_count(),
+                                           manifest=manifest, profile=profile)
+
+    if args.cprofile:
+        cprofile.disable()
+        cprofile.dump_stats(args.cprofile)
+    if profile is not None:
+        profile.save(args.profile)
+
+    for name in sorted(violations):
+        print(f'warning: {name}')
+        for line in violations[name]:
+            print(f'  {line}')
+    print(f'{len(written)} footprints written, '
+          f'{len(violations)} fail the design rule checks')
+
+    # a filtered run can't tell which footprints are stale
+    if not filtered:
+        stale = manifest.stale(groups=set(s['group'] for s in footprint_specs))
+        for f in stale:
+            print(f'{"removed" if args.prune else "stale"}: {f}')
+        if args.prune:
+            manifest.prune(stale)
+
+    manifest.save(partial=filtered)
+
+    sys.exit(1 if args.strict and violations else 0)
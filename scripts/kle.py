@@ -0,0 +1,314 @@
+import argparse
+import ast
+import itertools
+import json
+import math
+import sys
+from functools import lru_cache
+
+from keycap import keycap_outline
+from keyswitch_generator import build_footprint, footprint_specs, keycaps
+from switch import StabilizerCherryMX
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+STABILIZER_GROUP = 'Mounting_Keyboard_Stabilizer'
+
+# key width in units -> StabilizerCherryMX size, from the widths each size
+# is documented for, e.g. 2.25u uses the 2u stabilizer
+stabilizer_sizes = dict((float(desc[:-1]), size)
+                        for size, entry in StabilizerCherryMX.lu_table.items()
+                        for desc in entry['desc'].split())
+
+
+class Key:
+    def __init__(self, label, x, y, width, height, rotation, rx, ry,
+                 x2=0, y2=0, width2=None, height2=None):
+        # all in keyboard units, x and y are the top left corner of the key
+        # before rotating by rotation degrees (clockwise) around rx, ry
+        self.label = label
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.rotation = rotation
+        self.rx = rx
+        self.ry = ry
+        self.x2 = x2
+        self.y2 = y2
+        self.width2 = width if width2 is None else width2
+        self.height2 = height if height2 is None else height2
+
+    def is_iso_enter(self):
+        return (self.width, self.height, self.x2, self.y2,
+                self.width2, self.height2) == (1.25, 2, -0.25, 0, 1.5, 1)
+
+
+def parse(layout):
+    # Keys of a keyboard-layout-editor JSON layout (the decoded list of rows,
+    # optionally starting with the keyboard metadata), following the
+    # positioning rules of KLE's serial.js. Decals are not keys and skipped.
+    keys = []
+
+    rotation = rx = ry = 0
+    x = y = 0
+
+    for row in layout:
+        if isinstance(row, dict):
+            continue
+
+        width = height = 1
+        x2 = y2 = 0
+        width2 = height2 = None
+        decal = False
+
+        for item in row:
+            if isinstance(item, dict):
+                if 'r' in item:
+                    rotation = item['r']
+                if 'rx' in item:
+                    rx = item['rx']
+                    x, y = rx, ry
+                if 'ry' in item:
+                    ry = item['ry']
+                    x, y = rx, ry
+                x += item.get('x', 0)
+                y += item.get('y', 0)
+                width = item.get('w', width)
+                height = item.get('h', height)
+                x2 = item.get('x2', x2)
+                y2 = item.get('y2', y2)
+                width2 = item.get('w2', width2)
+                height2 = item.get('h2', height2)
+                decal = item.get('d', decal)
+                continue
+
+            if not decal:
+                label = next((s for s in str(item).split('\n') if s), '')
+                keys.append(Key(label, x, y, width, height, rotation, rx, ry,
+                                x2, y2, width2, height2))
+
+            x += width
+            width = height = 1
+            x2 = y2 = 0
+            width2 = height2 = None
+            decal = False
+
+        y += 1
+        x = rx
+
+    return keys
+
+
+def transform(keys, x_spacing, y_spacing):
+    # Centers (mm) and KiCad rotations (degrees, counter-clockwise) of keys.
+    # Positions are scaled to mm before rotating, so rotated clusters keep
+    # their shape with non-square spacing.
+    if np is not None:
+        a = np.array([(k.x + k.width / 2, k.y + k.height / 2,
+                       k.rx, k.ry, k.rotation) for k in keys],
+                     dtype=float).reshape(-1, 5)
+        scale = np.array([x_spacing, y_spacing])
+        center = a[:, 0:2] * scale
+        origin = a[:, 2:4] * scale
+        angle = np.radians(a[:, 4])
+        cos = np.cos(angle)
+        sin = np.sin(angle)
+        d = center - origin
+        x = origin[:, 0] + d[:, 0] * cos - d[:, 1] * sin
+        y = origin[:, 1] + d[:, 0] * sin + d[:, 1] * cos
+        rotation = np.mod(-a[:, 4], 360) + 0.0
+        return x.tolist(), y.tolist(), rotation.tolist()
+
+    xs, ys, rotations = [], [], []
+    for k in keys:
+        cx = (k.x + k.width / 2) * x_spacing
+        cy = (k.y + k.height / 2) * y_spacing
+        ox = k.rx * x_spacing
+        oy = k.ry * y_spacing
+        angle = math.radians(k.rotation)
+        xs.append(ox + (cx - ox) * math.cos(angle) - (cy - oy) * math.sin(angle))
+        ys.append(oy + (cx - ox) * math.sin(angle) + (cy - oy) * math.cos(angle))
+        rotations.append(-k.rotation % 360 + 0.0)
+    return xs, ys, rotations
+
+
+def find_spec(cls, kwargs):
+    # the footprint_specs entry generating cls with these parameters
+    for spec in footprint_specs:
+        axes = spec.get('axes', {})
+        if spec['class'] is cls and set(axes) == set(kwargs) and \
+                all(kwargs[k] in axes[k] for k in axes):
+            return spec
+    raise ValueError(f'{cls.__name__} {kwargs} is not in the library')
+
+
+def library_options(cls):
+    # the -O parameter combinations footprint_specs has cls with
+    options = []
+    for spec in footprint_specs:
+        if spec['class'] is cls:
+            axes = spec.get('axes', {})
+            for values in itertools.product(*axes.values()):
+                options.append(' '.join(f'-O {k}={v}'
+                                    for k, v in zip(axes, values)))
+    return options
+
+
+def switch_class(parser, args):
+    # (class, parameters) of the -c and -O arguments, exits through parser
+    # listing the valid choices when the library has no such footprints
+    classes = {s['class'].__name__: s['class'] for s in footprint_specs}
+    if args.cls not in classes:
+        parser.error(f'unknown class {args.cls}, use one of: '
+                     f'{", ".join(sorted(classes))}')
+    cls, kwargs = classes[args.cls], dict(args.option)
+    try:
+        find_spec(cls, kwargs)
+    except ValueError as e:
+        parser.error(f'{e}, use one of: ' + ', '.join(
+            option or 'no -O' for option in library_options(cls)))
+    return cls, kwargs
+
+
+def keycap_key(key, keys):
+    # the keycaps entry of a KLE key among keys, None if there is none
+    if key.is_iso_enter():
+        wanted = {'keycap_type': 'ISOEnter'}
+    elif key.height == 1:
+        wanted = {'keycap_type': 'regular', 'width': key.width}
+    elif key.width == 1:
+        wanted = {'keycap_type': 'regular', 'width': key.height,
+                  'rotation': 90}
+    else:
+        return None
+    return next((k for k in keys if keycaps[k] == wanted), None)
+
+
+@lru_cache(maxsize=None)
+def _base_name(group, cls, kwargs):
+    return build_footprint((group, cls, dict(kwargs), None), lazy=True).name
+
+
+def _footprint_name(group, cls, kwargs, keycap):
+    name = _base_name(group, cls, tuple(sorted(kwargs.items())))
+    if keycap is None:
+        return name
+    tags, _ = keycap_outline(keycap['keycap_type'],
+                             keycap.get('x_spacing', keycap.get('spacing')),
+                             keycap.get('y_spacing', keycap.get('spacing')),
+                             keycap.get('width'), keycap.get('rotation', 0),
+                             keycap.get('x_offset', 0), keycap.get('y_offset', 0))
+    return f'{name}_{tags.replace(" ", "_")}'
+
+
+def place(keys, cls, kwargs=None, with_keycaps=True, stabilizers=True):
+    # Placements of a footprint of cls (constructed with kwargs) per key, and
+    # of a Cherry MX stabilizer per key that needs one. Each placement is a
+    # dict with reference, footprint name, library group, x, y (mm), KiCad
+    # rotation, the KLE label and the variant build_footprint() takes.
+    kwargs = kwargs or {}
+    spec = find_spec(cls, kwargs)
+    spacing = spec['spacing']
+    x_spacing = spacing.get('x_spacing', spacing.get('spacing'))
+    y_spacing = spacing.get('y_spacing', spacing.get('spacing'))
+
+    xs, ys, rotations = transform(keys, x_spacing, y_spacing)
+
+    switches = []
+    stabs = []
+    for i, key in enumerate(keys):
+        keycap = None
+        if with_keycaps:
+            name = keycap_key(key, spec.get('keys', []))
+            if name is None:
+                raise ValueError(f'key {key.label!r} at {key.x}, {key.y} '
+                                 f'({key.width}u x {key.height}u) has no '
+                                 f'{cls.__name__} keycap footprint')
+            keycap = dict(spacing, **keycaps[name])
+
+        variant = (spec['group'], cls, kwargs, keycap)
+        switches.append({'reference': f'SW{i + 1}',
+                         'footprint': _footprint_name(*variant),
+                         'group': spec['group'],
+                         'x': xs[i], 'y': ys[i], 'rotation': rotations[i],
+                         'label': key.label,
+                         'variant': variant})
+
+        if not stabilizers:
+            continue
+
+        if key.is_iso_enter():
+            size, rotation = 2, rotations[i] + 90
+        elif key.height == 1 or key.width != 1:
+            size, rotation = stabilizer_sizes.get(key.width), rotations[i]
+        else:
+            size, rotation = stabilizer_sizes.get(key.height), rotations[i] + 90
+        if size is None:
+            continue
+
+        variant = (STABILIZER_GROUP, StabilizerCherryMX, {'size': size}, None)
+        stabs.append({'reference': f'ST{len(stabs) + 1}',
+                      'footprint': _footprint_name(*variant),
+                      'group': STABILIZER_GROUP,
+                      'x': xs[i], 'y': ys[i], 'rotation': rotation % 360,
+                      'label': key.label,
+                      'variant': variant})
+
+    return switches + stabs
+
+
+def _option(value):
+    key, _, value = value.partition('=')
+    try:
+        value = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        pass
+    return key, value
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Place library footprints for a keyboard-layout-editor '
+                    'layout.',
+        usage='%(prog)s [options] layout.json')
+
+    parser.add_argument('layout', type=str,
+                        help='KLE JSON layout (Download JSON)')
+
+    parser.add_argument('-c', '--class',
+                        type=str, default='SwitchCherryMX', dest='cls',
+                        help='switch class (default: %(default)s)')
+
+    parser.add_argument('-O', '--option',
+                        type=_option, action='append', default=[],
+                        help='switch class parameter, e.g. switch_type=PCB')
+
+    parser.add_argument('--no-keycap',
+                        action='store_true',
+                        help='place footprints without keycap outline')
+
+    parser.add_argument('--no-stabilizer',
+                        action='store_true',
+                        help='do not place stabilizers')
+
+    args = parser.parse_args()
+
+    with open(args.layout) as f:
+        keys = parse(json.load(f))
+
+    cls, kwargs = switch_class(parser, args)
+    try:
+        placements = place(keys, cls, kwargs, with_keycaps=not args.no_keycap,
+                           stabilizers=not args.no_stabilizer)
+    except ValueError as e:
+        parser.error(str(e))
+
+    for p in placements:
+        print(f'{p["reference"]}\t{p["group"]}:{p["footprint"]}\t'
+              f'{p["x"]:.4f}\t{p["y"]:.4f}\t{p["rotation"]:g}\t{p["label"]}')
+
+    sys.exit(0)
@@ -0,0 +1,323 @@
+import argparse
+import math
+import os
+import sqlite3
+import sys
+
+from keyswitch_generator import build_footprint, plan
+from sexpr import Reader
+
+SCHEMA = '''
+CREATE TABLE footprints (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    library TEXT NOT NULL,
+    description TEXT,
+    tags TEXT,
+    attr TEXT,
+    keycap TEXT,
+    keycap_width REAL,
+    keycap_rotation REAL,
+    crtyd_min_x REAL,
+    crtyd_min_y REAL,
+    crtyd_max_x REAL,
+    crtyd_max_y REAL
+);
+CREATE TABLE tags (
+    footprint_id INTEGER NOT NULL REFERENCES footprints(id),
+    tag TEXT NOT NULL
+);
+CREATE TABLE pads (
+    footprint_id INTEGER NOT NULL REFERENCES footprints(id),
+    number TEXT,
+    type TEXT,
+    shape TEXT,
+    x REAL,
+    y REAL,
+    rotation REAL,
+    size_x REAL,
+    size_y REAL,
+    drill_x REAL,
+    drill_y REAL,
+    layers TEXT
+);
+CREATE TABLE models (
+    footprint_id INTEGER NOT NULL REFERENCES footprints(id),
+    filename TEXT NOT NULL
+);
+CREATE UNIQUE INDEX footprints_name ON footprints(library, name);
+CREATE INDEX footprints_keycap ON footprints(keycap_width);
+CREATE INDEX tags_tag ON tags(tag, footprint_id);
+CREATE INDEX pads_footprint ON pads(footprint_id);
+CREATE INDEX pads_drill ON pads(drill_x, type);
+CREATE INDEX models_footprint ON models(footprint_id);
+'''
+
+
+def _field(form, name):
+    for child in form[1:]:
+        if isinstance(child, list) and child and child[0] == name:
+            return child
+    return None
+
+
+def _arc_points(center, start, angle):
+    # start, end and the axis extremes swept by a .kicad_mod fp_arc
+    radius = math.hypot(start[0] - center[0], start[1] - center[1])
+    a0 = math.degrees(math.atan2(start[1] - center[1], start[0] - center[0]))
+    a1 = a0 + angle
+    points = [start]
+    for a in [a1] + [q for q in range(-720, 721, 90)
+                     if min(a0, a1) < q < max(a0, a1)]:
+        points.append((center[0] + radius * math.cos(math.radians(a)),
+                       center[1] + radius * math.sin(math.radians(a))))
+    return points
+
+
+def _courtyard(forms):
+    points = []
+    for form in forms:
+        layer = _field(form, 'layer')
+        if not layer or layer[1] not in ['F.CrtYd', 'B.CrtYd']:
+            continue
+        start = tuple(map(float, _field(form, 'start')[1:3]))
+        end = tuple(map(float, _field(form, 'end')[1:3]))
+        if form[0] == 'fp_line':
+            points += [start, end]
+        elif form[0] == 'fp_arc':
+            points += _arc_points(start, end, float(_field(form, 'angle')[1]))
+        elif form[0] == 'fp_circle':
+            r = math.hypot(end[0] - start[0], end[1] - start[1])
+            points += [(start[0] - r, start[1] - r), (start[0] + r, start[1] + r)]
+    if not points:
+        return None, None, None, None
+    xs, ys = zip(*points)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _pad(form):
+    at = _field(form, 'at')
+    size = _field(form, 'size')
+    drill = _field(form, 'drill')
+    drill_x = drill_y = None
+    if drill:
+        values = [v for v in drill[1:] if not isinstance(v, list) and v != 'oval']
+        drill_x = float(values[0])
+        drill_y = float(values[1] if len(values) > 1 else values[0])
+    return (form[1], form[2], form[3],
+            float(at[1]), float(at[2]), float(at[3]) if len(at) > 3 else 0.0,
+            float(size[1]), float(size[2]), drill_x, drill_y,
+            ' '.join(_field(form, 'layers')[1:]))
+
+
+def keycap_variants():
+    # {(library, footprint name): Keycap} of the generated footprints with a
+    # keycap outline, size tags in other names (stabilizers) are no keycaps
+    return {(variant[0], footprint.name): footprint.keycap
+            for variant in plan() if variant[3] is not None
+            for footprint in [build_footprint(variant, lazy=True)]}
+
+
+def _insert_footprints(db, library_path, keycaps):
+    # Adds every footprint of the .pretty directories in library_path to db,
+    # returns how many
+    count = 0
+    for library in sorted(os.listdir(library_path)):
+        if not library.endswith('.pretty'):
+            continue
+        library_dir = os.path.join(library_path, library)
+        for filename in sorted(os.listdir(library_dir)):
+            if not filename.endswith('.kicad_mod'):
+                continue
+            with Reader(os.path.join(library_dir, filename)) as reader:
+                forms = list(reader.forms(['descr', 'tags', 'attr', 'fp_line',
+                                           'fp_arc', 'fp_circle', 'pad',
+                                           'model']))
+                name = reader.root[1]
+
+            def first(kind):
+                return next((f[1] for f in forms if f[0] == kind), None)
+
+            tags = first('tags')
+            keycap = width = rotation = None
+            outline = keycaps.get((library[:-len('.pretty')], name))
+            if outline is not None:
+                keycap = outline.tags
+                width = float(outline.width) if outline.width else None
+                rotation = float(outline.rotation)
+
+            cursor = db.execute(
+                'INSERT INTO footprints VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, '
+                '?, ?, ?, ?)',
+                (name, library[:-len('.pretty')], first('descr'), tags,
+                 first('attr'), keycap, width, rotation, *_courtyard(forms)))
+            footprint_id = cursor.lastrowid
+
+            db.executemany('INSERT INTO tags VALUES (?, ?)',
+                           [(footprint_id, tag)
+                            for tag in dict.fromkeys((tags or '').split())])
+            db.executemany('INSERT INTO pads VALUES (?, ?, ?, ?, ?, ?, ?, ?, '
+                           '?, ?, ?, ?)',
+                           [(footprint_id, *_pad(f))
+                            for f in forms if f[0] == 'pad'])
+            db.executemany('INSERT INTO models VALUES (?, ?)',
+                           [(footprint_id, f[1])
+                            for f in forms if f[0] == 'model'])
+            count += 1
+
+    return count
+
+
+def build(library_path, index_path):
+    # Compiles every footprint of the .pretty directories in library_path
+    # into a fresh SQLite database at index_path, a failed build leaves
+    # neither the database nor its temporary file behind
+    keycaps = keycap_variants()
+    tmp_path = f'{index_path}.{os.getpid()}.tmp'
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+    try:
+        db = sqlite3.connect(tmp_path)
+        try:
+            db.executescript(SCHEMA)
+            count = _insert_footprints(db, library_path, keycaps)
+            db.commit()
+            db.execute('VACUUM')
+        finally:
+            db.close()
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return count
+
+
+class FootprintIndex:
+    # Query API over an index written by build()
+
+    def __init__(self, index_path):
+        self.db = sqlite3.connect(f'file:{index_path}?mode=ro', uri=True)
+        self.db.row_factory = sqlite3.Row
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def find(self, library=None, name=None, tags=None, min_keycap=None,
+             max_keycap=None, keycap=None, pad_type=None, pad_drill=None,
+             pad_at=None, tolerance=0.001):
+        # Footprints matching every given criterion. name is a SQL LIKE
+        # pattern, tags must all be present, pad_* must hold for one single
+        # pad. keycap widths only exist for regular keycaps, ISOEnter is
+        # matched by keycap='ISOEnter'. Returns sqlite3.Row objects of the
+        # footprints table.
+        where = []
+        params = []
+
+        if library is not None:
+            where.append('f.library = ?')
+            params.append(library)
+        if name is not None:
+            where.append('f.name LIKE ?')
+            params.append(name)
+        for tag in tags or []:
+            where.append('f.id IN (SELECT footprint_id FROM tags WHERE tag = ?)')
+            params.append(tag)
+        if min_keycap is not None:
+            where.append('f.keycap_width >= ?')
+            params.append(min_keycap)
+        if max_keycap is not None:
+            where.append('f.keycap_width <= ?')
+            params.append(max_keycap)
+        if keycap is not None:
+            where.append('f.keycap = ?')
+            params.append(keycap)
+
+        pad = []
+        if pad_type is not None:
+            pad.append('p.type = ?')
+            params.append(pad_type)
+        if pad_drill is not None:
+            pad.append('p.drill_x BETWEEN ? AND ?')
+            params += [pad_drill - tolerance, pad_drill + tolerance]
+        if pad_at is not None:
+            pad.append('p.x BETWEEN ? AND ? AND p.y BETWEEN ? AND ?')
+            params += [pad_at[0] - tolerance, pad_at[0] + tolerance,
+                       pad_at[1] - tolerance, pad_at[1] + tolerance]
+        if pad:
+            where.append('f.id IN (SELECT footprint_id FROM pads p WHERE ' +
+                         ' AND '.join(pad) + ')')
+
+        query = 'SELECT * FROM footprints f'
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += ' ORDER BY f.library, f.name'
+        return self.db.execute(query, params).fetchall()
+
+    def pads(self, footprint_id):
+        return self.db.execute('SELECT * FROM pads WHERE footprint_id = ?',
+                               (footprint_id,)).fetchall()
+
+    def models(self, footprint_id):
+        return [row['filename'] for row in self.db.execute(
+            'SELECT filename FROM models WHERE footprint_id = ?',
+            (footprint_id,))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Build and query an index of the footprint library.',
+        usage='%(prog)s [options] build|query')
+
+    parser.add_argument('command', choices=['build', 'query'])
+
+    parser.add_argument('-i', '--index',
+                        type=str, default='./footprints.sqlite',
+                        help='index file (default: %(default)s)')
+
+    parser.add_argument('-l', '--library',
+                        type=str,
+                        default=os.path.join(os.path.dirname(__file__), '..',
+                                             'library', 'footprints'),
+                        help='footprint library path to build the index from '
+                             '(default: the committed library)')
+
+    parser.add_argument('-g', '--group', type=str, default=None,
+                        help='query: library, e.g. Switch_Keyboard_Kailh')
+    parser.add_argument('-n', '--name', type=str, default=None,
+                        help='query: name pattern, e.g. SW_Cherry_MX_%%')
+    parser.add_argument('-t', '--tag', type=str, action='append',
+                        help='query: required tag, may be repeated')
+    parser.add_argument('--keycap', type=str, default=None,
+                        help='query: keycap, e.g. 2.25u or ISOEnter')
+    parser.add_argument('--min-keycap', type=float, default=None,
+                        help='query: minimum keycap width in units')
+    parser.add_argument('--max-keycap', type=float, default=None,
+                        help='query: maximum keycap width in units')
+    parser.add_argument('--pad-type', type=str, default=None,
+                        help='query: pad type, e.g. thru_hole or np_thru_hole')
+    parser.add_argument('--pad-drill', type=float, default=None,
+                        help='query: pad drill in mm')
+    parser.add_argument('--pad-at', type=float, nargs=2, default=None,
+                        help='query: pad position in mm')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        count = build(args.library, args.index)
+        print(f'{count} footprints indexed in {args.index}')
+        sys.exit(0)
+
+    with FootprintIndex(args.index) as index:
+        rows = index.find(library=args.group, name=args.name, tags=args.tag,
+                          keycap=args.keycap, min_keycap=args.min_keycap,
+                          max_keycap=args.max_keycap, pad_type=args.pad_type,
+                          pad_drill=args.pad_drill, pad_at=args.pad_at)
+        for row in rows:
+            print(f'{row["library"]}:{row["name"]}')
@@ -0,0 +1,244 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+from contextlib import nullcontext
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import vrml
+from vrml import MODELS_PATH, Node, faces, terminated
+
+# file name suffix of low detail models, keyswitch_generator.py --model-lod
+# references them
+SUFFIX = '_LOD'
+TRIANGLES = 2000
+CACHE_NAME = '.lod.json'
+# part of the cache key, bump it when decimate() or the VRML writer change
+# the models they make
+VERSION = 1
+
+
+def _triangles(index):
+    # fan triangulation of a coordIndex, keeping the winding, (n, 3)
+    index = terminated(index)
+    end = index < 0
+    face, lengths = faces(index)
+    corners, face = index[~end], face[~end]
+    start = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    k = np.nonzero(np.arange(len(corners)) - start[face] >= 2)[0]
+    return np.stack([corners[start[face[k]]], corners[k - 1], corners[k]],
+                    axis=1)
+
+
+def _cluster(points, cell):
+    # cluster of every point on a grid of cell sized cubes
+    cells = np.floor(points / cell).astype(np.int64)
+    cells -= cells.min(axis=0)
+    n = cells.max(axis=0) + 1
+    key = (cells[:, 0] * n[1] + cells[:, 1]) * n[2] + cells[:, 2]
+    return np.unique(key, return_inverse=True)[1].ravel()
+
+
+def decimate(nodes, triangles=TRIANGLES):
+    # Vertex clustering: the points of all shapes are snapped to the centre
+    # of the grid cell they fall in, with the cell size searched so the
+    # model keeps at most triangles triangles. Shapes share the grid, so
+    # their seams stay closed. Changes the IndexedFaceSets of nodes in
+    # place, shapes left without faces lose their geometry.
+    shapes, face_sets = [], []
+    for node, _ in vrml.shapes(nodes):
+        face_set = node.get('geometry')
+        if isinstance(face_set, Node) and face_set.type == 'IndexedFaceSet' \
+                and isinstance(face_set.get('coord'), Node):
+            shapes.append(node)
+            face_sets.append(face_set)
+
+    points, tris, owner = [], [], []
+    offset = 0
+    for n, face_set in enumerate(face_sets):
+        p = face_set.get('coord').get('point').reshape(-1, 3)
+        t = _triangles(face_set.get('coordIndex'))
+        points.append(p)
+        tris.append(t + offset)
+        owner.append(np.full(len(t), n))
+        offset += len(p)
+    if not face_sets:
+        return nodes
+    points = np.concatenate(points)
+    tris = np.concatenate(tris)
+    owner = np.concatenate(owner)
+
+    def reduce(cell):
+        cluster = _cluster(points, cell)
+        t = cluster[tris]
+        keep = (t[:, 0] != t[:, 1]) & (t[:, 1] != t[:, 2]) & \
+            (t[:, 0] != t[:, 2])
+        t, o = t[keep], owner[keep]
+        # the same triangle, in any winding, once per shape
+        t_sorted = np.sort(t, axis=1)
+        order = np.lexsort((t_sorted[:, 2], t_sorted[:, 1], t_sorted[:, 0],
+                            o))
+        key = np.concatenate([o[:, None], t_sorted], axis=1)[order]
+        first = order[np.concatenate(
+            [[True], (key[1:] != key[:-1]).any(axis=1)])]
+        first.sort()
+        return cluster, t[first], o[first]
+
+    if len(tris) > triangles:
+        # binary search of the cell size on a log scale
+        size = np.ptp(points, axis=0).max()
+        low, high = np.log(size * 1e-5), np.log(size)
+        best = None
+        for _ in range(24):
+            cell = np.exp((low + high) / 2)
+            result = reduce(cell)
+            if len(result[1]) > triangles:
+                low = np.log(cell)
+            else:
+                high = np.log(cell)
+                best = result
+        cluster, tris, owner = best if best is not None else reduce(size)
+
+        counts = np.bincount(cluster)
+        centres = np.stack([np.bincount(cluster, weights=points[:, i]) /
+                            counts for i in range(3)], axis=1)
+    else:
+        centres = points
+
+    for n, (node, face_set) in enumerate(zip(shapes, face_sets)):
+        t = tris[owner == n]
+        if not len(t):
+            node.fields = [(name, value) for name, value in node.fields
+                           if name != 'geometry']
+            continue
+        used, local = np.unique(t, return_inverse=True)
+        local = local.reshape(-1, 3)
+        face_set.get('coord').set('point', centres[used].ravel())
+        face_set.set('coordIndex', np.concatenate(
+            [local, np.full((len(local), 1), -1)], axis=1).ravel())
+    return nodes
+
+
+def _count(nodes):
+    return sum(len(_triangles(node.get('geometry').get('coordIndex')))
+               for node, _ in vrml.shapes(nodes)
+               if node.get('geometry') is not None)
+
+
+def lod_name(model):
+    name, ext = os.path.splitext(model)
+    return f'{name}{SUFFIX}{ext}'
+
+
+def source_digest(model, triangles, decimals):
+    # what a low detail model depends on: the source model, the decimation
+    # parameters and VERSION
+    h = hashlib.sha256()
+    with open(model, 'rb') as f:
+        h.update(f.read())
+    h.update(repr((VERSION, triangles, decimals)).encode())
+    return h.hexdigest()
+
+
+def make_lod(source, target, triangles=TRIANGLES, decimals=vrml.DECIMALS):
+    # Writes the low detail version of source to target, returns the number
+    # of triangles of both
+    nodes = vrml.compact(vrml.read(source), decimals)
+    before = _count(nodes)
+    nodes = vrml.compact(decimate(nodes, triangles), decimals)
+    after = _count(nodes)
+    vrml.write(target, vrml.dumps(nodes, decimals))
+    return before, after
+
+
+def _make_lod_task(task):
+    digest, source, target, triangles, decimals = task
+    return digest, source, target, make_lod(source, target, triangles,
+                                            decimals)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=f'Write low detail {SUFFIX} companions of VRML models '
+                    f'for large boards. Models are only decimated again '
+                    f'when their source changes.',
+        usage='%(prog)s [options] [model.wrl ...]')
+
+    parser.add_argument('models', type=str, nargs='*',
+                        help='models to decimate (default: every .wrl of '
+                             'the library)')
+
+    parser.add_argument('-o', '--output',
+                        type=str, default=MODELS_PATH,
+                        help='output path (default: the library models)')
+
+    parser.add_argument('-t', '--triangles',
+                        type=int, default=TRIANGLES,
+                        help='most triangles of a low detail model '
+                             '(default: %(default)s)')
+
+    parser.add_argument('--wrz',
+                        action='store_true',
+                        help='write gzipped .wrz models')
+
+    parser.add_argument('-f', '--force',
+                        action='store_true',
+                        help='decimate every model, ignoring the cache')
+
+    parser.add_argument('-j', '--jobs',
+                        type=int, default=1,
+                        help='number of worker processes, 0 uses all cores '
+                             '(default: %(default)s)')
+
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error('numpy is required, install it with pip install numpy')
+
+    models = args.models or sorted(
+        os.path.join(MODELS_PATH, f) for f in os.listdir(MODELS_PATH)
+        if f.endswith('.wrl') and not f.endswith(f'{SUFFIX}.wrl'))
+
+    os.makedirs(args.output, exist_ok=True)
+    cache_filename = os.path.join(args.output, CACHE_NAME)
+    cache = {}
+    if os.path.isfile(cache_filename) and not args.force:
+        with open(cache_filename) as f:
+            cache = json.load(f)
+
+    tasks = []
+    for model in models:
+        name = os.path.splitext(os.path.basename(model))[0]
+        target = os.path.join(args.output, lod_name(
+            name + ('.wrz' if args.wrz else '.wrl')))
+        digest = source_digest(model, args.triangles, vrml.DECIMALS)
+        key = os.path.basename(target)
+        if cache.get(key) == digest and os.path.isfile(target):
+            continue
+        tasks.append((digest, model, target, args.triangles, vrml.DECIMALS))
+
+    jobs = args.jobs or os.cpu_count()
+    pool = multiprocessing.Pool(jobs) if jobs != 1 else None
+    with pool or nullcontext():
+        results = map(_make_lod_task, tasks) if pool is None \
+            else pool.imap_unordered(_make_lod_task, tasks)
+
+        for digest, model, target, (before, after) in results:
+            print(f'{os.path.basename(model)}: {before} -> {after} triangles')
+            cache[os.path.basename(target)] = digest
+
+    tmp_filename = f'{cache_filename}.{os.getpid()}.tmp'
+    with open(tmp_filename, 'w') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp_filename, cache_filename)
+
+    print(f'{len(tasks)} models decimated, '
+          f'{len(models) - len(tasks)} up to date')
+    sys.exit(0)
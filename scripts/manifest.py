@@ -0,0 +1,115 @@
+import hashlib
+import inspect
+import json
+import os
+import sys
+from functools import lru_cache
+
+MANIFEST_NAME = '.manifest.json'
+
+
+@lru_cache(maxsize=None)
+def source(obj):
+    return inspect.getsource(obj)
+
+
+def inputs_digest(cls, kwargs, keycap, path3d):
+    # everything a footprint is built from: the source of its class and of
+    # the switch.py bases it inherits from, the shared util and keycap
+    # helpers, the serializer, the design rule checks, and the parameters
+    # the class is constructed with
+    h = hashlib.sha256()
+    for base in cls.__mro__:
+        if base.__module__ == cls.__module__:
+            h.update(source(base).encode())
+    h.update(source(sys.modules['util']).encode())
+    h.update(source(sys.modules['emitter']).encode())
+    h.update(source(sys.modules['drc']).encode())
+    if keycap is not None:
+        h.update(source(sys.modules['keycap']).encode())
+    h.update(repr((sorted(kwargs.items()), keycap and sorted(keycap.items()),
+                   path3d)).encode())
+    return h.hexdigest()
+
+
+def output_digest(data: bytes):
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digest(filename):
+    try:
+        with open(filename, 'rb') as f:
+            return output_digest(f.read())
+    except FileNotFoundError:
+        return None
+
+
+class Manifest:
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.filename = os.path.join(output_path, MANIFEST_NAME)
+        self.entries = {}
+        self.seen = {}
+
+        if os.path.isfile(self.filename):
+            with open(self.filename) as f:
+                self.entries = json.load(f)
+
+    def _path(self, filename):
+        return os.path.relpath(filename, self.output_path).replace(os.sep, '/')
+
+    def is_current(self, digest):
+        entry = self.entries.get(digest)
+        if entry is None:
+            return False
+        filename = os.path.join(self.output_path, entry['file'])
+        if file_digest(filename) != entry['output']:
+            return False
+        self.seen[digest] = entry
+        return True
+
+    def update(self, digest, filename, out_digest, violations=()):
+        self.seen[digest] = {'file': self._path(filename), 'output': out_digest}
+        if violations:
+            self.seen[digest]['violations'] = list(violations)
+
+    def violations(self):
+        # {file: [design rule violations]} of the footprints of this run
+        return {entry['file']: entry['violations']
+                for entry in self.seen.values() if entry.get('violations')}
+
+    def stale(self, groups=None):
+        # footprints recorded by a previous run or lying in a group directory
+        # that this run did not produce
+        produced = set(entry['file'] for entry in self.seen.values())
+        stale = set(entry['file'] for entry in self.entries.values())
+
+        for group in groups or []:
+            group_dir = f'{group}.pretty'
+            if not os.path.isdir(os.path.join(self.output_path, group_dir)):
+                continue
+            for name in os.listdir(os.path.join(self.output_path, group_dir)):
+                if name.endswith('.kicad_mod'):
+                    stale.add(f'{group_dir}/{name}')
+
+        return sorted(f for f in stale - produced
+                      if os.path.isfile(os.path.join(self.output_path, f)))
+
+    def prune(self, stale):
+        for f in stale:
+            os.unlink(os.path.join(self.output_path, f))
+
+    def save(self, partial=False):
+        # a partial run keeps the entries of footprints it did not visit
+        entries = {}
+        if partial:
+            produced = set(entry['file'] for entry in self.seen.values())
+            entries = {digest: entry for digest, entry in self.entries.items()
+                       if entry['file'] not in produced}
+        entries.update(self.seen)
+
+        tmp_filename = f'{self.filename}.{os.getpid()}.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump(entries, f, indent=1, sort_keys=True)
+            f.write('\n')
+        os.replace(tmp_filename, self.filename)
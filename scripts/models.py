@@ -0,0 +1,201 @@
+import argparse
+import gzip
+import multiprocessing
+import os
+import re
+import sys
+from contextlib import nullcontext
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from emitter import SwitchFileHandler
+from keyswitch_generator import build_footprint, path3d, plan
+
+LIBRARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                            'library', '3dmodels')
+
+# the library directory as Model paths reference it
+LIBRARY_PREFIX = os.path.dirname(path3d.rstrip('/')) + '/'
+
+# VRML units of KiCad models are 0.1in
+VRML_UNIT = 2.54
+
+# how far the outline of a model may stick out of the switch_w x switch_h
+# body outline in mm, hotswap socket models only cover a part of it
+TOLERANCE = 1.0
+
+_POINT = re.compile(r'Coordinate\s*\{\s*point\s*\[([^\]]*)\]')
+
+
+def index_models(path=LIBRARY_PATH):
+    # {name under the library prefix: file} of every file in the library
+    index = {}
+    for dirpath, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            file = os.path.join(dirpath, filename)
+            index[os.path.relpath(file, path).replace(os.sep, '/')] = file
+    return index
+
+
+def model_bounds(filename, chunk_size=1 << 20):
+    # Bounding box (min xyz, max xyz) of the Coordinate points of a .wrl or
+    # gzipped .wrz model in VRML units. The file is read in chunks and only
+    # the point arrays are parsed, an array split between chunks is kept
+    # until it is complete.
+    low = np.full(3, np.inf)
+    high = np.full(3, -np.inf)
+    opener = gzip.open if filename.endswith('.wrz') else open
+    with opener(filename, 'rt', encoding='utf-8') as f:
+        buffer = ''
+        while True:
+            data = f.read(chunk_size)
+            buffer += data
+            end = 0
+            for match in _POINT.finditer(buffer):
+                points = np.array(match.group(1).replace(',', ' ').split(),
+                                  dtype=float).reshape(-1, 3)
+                if len(points):
+                    low = np.minimum(low, points.min(axis=0))
+                    high = np.maximum(high, points.max(axis=0))
+                end = match.end()
+            if not data:
+                break
+            rest = buffer[end:]
+            start = rest.rfind('Coordinate')
+            buffer = rest[start:] if start >= 0 else rest[-len('Coordinate'):]
+    return low, high
+
+
+def _model_bounds_task(filename):
+    return filename, model_bounds(filename)
+
+
+def footprint_models(variants):
+    # (footprint, Model node, switch_w, switch_h) of every model the
+    # variants reference. Keycaps do not change models, so every switch is
+    # built once.
+    built = {}
+    for variant in variants:
+        key = (variant[0], variant[1], repr(sorted(variant[2].items())))
+        if key in built:
+            continue
+        switch = build_footprint(variant[:3] + (None,))
+        built[key] = [(f'{variant[0]}:{switch.name}', node,
+                       getattr(switch, 'switch_w', None),
+                       getattr(switch, 'switch_h', None))
+                      for node_type, node in SwitchFileHandler(switch).nodes()
+                      if node_type == 'Model']
+    return [model for models in built.values() for model in models]
+
+
+def check(variants, index=None, jobs=1, tolerance=TOLERANCE):
+    # Problems of the 3D models the variants reference, as messages: models
+    # missing from the library and models whose outline does not match the
+    # switch body
+    index = index_models() if index is None else index
+    lowercase = {name.lower(): name for name in index}
+    problems = []
+
+    references = {}
+    for footprint, node, switch_w, switch_h in footprint_models(variants):
+        if not node.filename.startswith(LIBRARY_PREFIX):
+            problems.append(f'{footprint}: {node.filename} is outside '
+                            f'{LIBRARY_PREFIX}')
+            continue
+        name = node.filename[len(LIBRARY_PREFIX):]
+        if name not in index:
+            hint = lowercase.get(name.lower())
+            problems.append(f'{footprint}: {name} does not exist' +
+                            (f', did you mean {hint}?' if hint else ''))
+            continue
+        references.setdefault(index[name], []).append(
+            (footprint, node, switch_w, switch_h))
+
+    files = sorted(f for f in references if f.endswith(('.wrl', '.wrz')))
+    pool = multiprocessing.Pool(jobs) if jobs != 1 else None
+    with pool or nullcontext():
+        bounds = dict(map(_model_bounds_task, files) if pool is None
+                      else pool.imap(_model_bounds_task, files))
+
+    for file in files:
+        low, high = bounds[file]
+        if not np.isfinite(low).all():
+            problems.append(f'{os.path.basename(file)} has no geometry')
+            continue
+        for footprint, node, switch_w, switch_h in references[file]:
+            if switch_w is None or (node.rotate.x, node.rotate.y,
+                                    node.rotate.z) != (0, 0, 0):
+                continue
+            # VRML y points up, KiCad y down
+            x0 = low[0] * VRML_UNIT * node.scale.x + node.at.x * 25.4
+            x1 = high[0] * VRML_UNIT * node.scale.x + node.at.x * 25.4
+            y0 = -high[1] * VRML_UNIT * node.scale.y - node.at.y * 25.4
+            y1 = -low[1] * VRML_UNIT * node.scale.y - node.at.y * 25.4
+            # sticking out, or smaller than half the body all around as a
+            # model in the wrong units is
+            if max(-switch_w / 2 - x0, x1 - switch_w / 2,
+                   -switch_h / 2 - y0, y1 - switch_h / 2) > tolerance or \
+                    max(x1 - x0, y1 - y0) < min(switch_w, switch_h) / 2:
+                problems.append(
+                    f'{footprint}: {os.path.basename(file)} spans '
+                    f'({x0:.2f}, {y0:.2f}) to ({x1:.2f}, {y1:.2f}), the '
+                    f'switch body is {switch_w:g} x {switch_h:g}')
+    return problems
+
+
+if __name__ == '__main__':
+    from keyswitch_generator import _csv
+
+    parser = argparse.ArgumentParser(
+        description='Check that the 3D models the generated footprints '
+                    'reference exist in the library and match the switch '
+                    'body outline.',
+        usage='%(prog)s [options]')
+
+    parser.add_argument('-g', '--group',
+                        type=_csv, default=None,
+                        help='only check these groups (comma separated)')
+
+    parser.add_argument('-c', '--class',
+                        type=_csv, default=None, dest='classes',
+                        help='only check these switch classes '
+                             '(comma separated)')
+
+    parser.add_argument('--model-format',
+                        type=str, choices=['wrl', 'wrz'], default='wrl',
+                        help='model files the footprints reference '
+                             '(default: %(default)s)')
+
+    parser.add_argument('--model-lod',
+                        action='store_true',
+                        help='footprints reference the _LOD models')
+
+    parser.add_argument('-t', '--tolerance',
+                        type=float, default=TOLERANCE,
+                        help='how far a model may stick out of the switch '
+                             'body outline in mm (default: %(default)s)')
+
+    parser.add_argument('-j', '--jobs',
+                        type=int, default=1,
+                        help='number of worker processes, 0 uses all cores '
+                             '(default: %(default)s)')
+
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error('numpy is required, install it with pip install numpy')
+
+    variants = plan(groups=args.group, classes=args.classes, keys=['none'],
+                    model3d_ext=None if args.model_format == 'wrl'
+                    else args.model_format,
+                    model3d_suffix='_LOD' if args.model_lod else None)
+    problems = check(variants, jobs=args.jobs or os.cpu_count(),
+                     tolerance=args.tolerance)
+
+    for problem in problems:
+        print(problem)
+    print(f'{len(problems)} problems found')
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,197 @@
+import argparse
+import io
+import json
+import os
+import sys
+
+from emitter import SwitchFileHandler, _num
+from keyswitch_generator import build_footprint
+from spatial import EPS, GridIndex, area, bbox, chain, edges, inside, \
+                    on_segment, rotate, simplify, splits
+
+CUTOUT_LAYER = 'Eco1.User'
+
+
+def footprint_cutouts(footprint):
+    # closed Eco1.User outlines of a footprint, positively oriented. RectLine
+    # and PolygoneLine cutouts are drawn as chains of lines, in order.
+    segments = []
+    for node_type, node in SwitchFileHandler(footprint).nodes():
+        if node_type == 'Line' and node.layer == CUTOUT_LAYER:
+            segments.append(((node.start_pos.x, node.start_pos.y),
+                             (node.end_pos.x, node.end_pos.y)))
+
+    loops = []
+    for loop in chain(segments):
+        loop = simplify(loop)
+        if len(loop) < 3:
+            continue
+        if area(loop) < 0:
+            loop.reverse()
+        loops.append(loop)
+    return loops
+
+
+def union(polygons):
+    # Union of positively oriented simple polygons, as positively oriented
+    # outlines and negatively oriented holes. Edges are split where they
+    # meet other polygons and the pieces inside another polygon, or shared
+    # with a polygon on the other side, are dropped.
+    if len(polygons) < 2:
+        return [list(p) for p in polygons]
+
+    index = GridIndex()
+    for polygon in polygons:
+        index.insert(bbox(polygon))
+
+    segments = []
+    for i, polygon in enumerate(polygons):
+        others = [j for j in index.query(index.boxes[i]) if j != i]
+        for p, q in edges(polygon):
+            params = [0, 1]
+            for j in others:
+                params += splits(p, q, polygons[j])
+            params = sorted(set(params))
+
+            for t0, t1 in zip(params, params[1:]):
+                if t1 - t0 <= EPS:
+                    continue
+                a = (p[0] + (q[0] - p[0]) * t0, p[1] + (q[1] - p[1]) * t0)
+                b = (p[0] + (q[0] - p[0]) * t1, p[1] + (q[1] - p[1]) * t1)
+                m = ((a[0] + b[0]) / 2, (a[1] + b[1]) / 2)
+                if _keep(i, a, b, m, polygons, others):
+                    segments.append((a, b))
+
+    return [loop for loop in (simplify(loop) for loop in chain(segments))
+            if len(loop) >= 3]
+
+
+def _keep(i, a, b, m, polygons, others):
+    for j in others:
+        polygon = polygons[j]
+        for r, s in edges(polygon):
+            if on_segment(m, r, s):
+                # shared boundary: same direction keeps one copy, opposite
+                # directions are an inner seam between the two polygons
+                same = ((b[0] - a[0]) * (s[0] - r[0]) +
+                        (b[1] - a[1]) * (s[1] - r[1])) > 0
+                if not same or j < i:
+                    return False
+                break
+        else:
+            if inside(m, polygon):
+                return False
+    return True
+
+
+def plate_cutouts(placements):
+    # Plate contours of placed footprints (see kle.place()), overlapping
+    # cutouts are merged. A grid index of the cutout bounding boxes limits
+    # every union to the cutouts actually touching each other.
+    cutouts = {}
+    polygons = []
+    index = GridIndex()
+    for placement in placements:
+        lib_id = f'{placement["group"]}:{placement["footprint"]}'
+        if lib_id not in cutouts:
+            cutouts[lib_id] = footprint_cutouts(
+                build_footprint(placement['variant']))
+        rotation = placement['rotation']
+        for cutout in cutouts[lib_id]:
+            polygon = []
+            for x, y in cutout:
+                x, y = rotate(x, y, rotation)
+                polygon.append((x + placement['x'], y + placement['y']))
+            polygons.append(polygon)
+            index.insert(bbox(polygon))
+
+    contours = []
+    for cluster in index.clusters():
+        contours += union([polygons[i] for i in cluster])
+    return contours
+
+
+def write_svg(stream, contours, margin=5):
+    x0, y0, x1, y1 = bbox([p for contour in contours for p in contour])
+    x0, y0, x1, y1 = x0 - margin, y0 - margin, x1 + margin, y1 + margin
+    stream.write(f'<svg xmlns="http://www.w3.org/2000/svg" '
+                 f'width="{_num(x1 - x0)}mm" height="{_num(y1 - y0)}mm" '
+                 f'viewBox="{_num(x0)} {_num(y0)} {_num(x1 - x0)} '
+                 f'{_num(y1 - y0)}">\n'
+                 f'  <path fill="none" stroke="black" stroke-width="0.1" d="')
+    for contour in contours:
+        stream.write('M' + ' L'.join(f'{_num(x)} {_num(y)}'
+                                     for x, y in contour) + ' Z\n')
+    stream.write('"/>\n</svg>\n')
+
+
+def write_dxf(stream, contours):
+    # R12 closed POLYLINEs in mm, y pointing up as DXF expects
+    stream.write('0\nSECTION\n2\nHEADER\n9\n$INSUNITS\n70\n4\n0\nENDSEC\n'
+                 '0\nSECTION\n2\nENTITIES\n')
+    for contour in contours:
+        stream.write('0\nPOLYLINE\n8\nPLATE\n66\n1\n70\n1\n')
+        for x, y in contour:
+            stream.write(f'0\nVERTEX\n8\nPLATE\n10\n{_num(x)}\n'
+                         f'20\n{_num(-y)}\n')
+        stream.write('0\nSEQEND\n8\nPLATE\n')
+    stream.write('0\nENDSEC\n0\nEOF\n')
+
+
+def write_plate(filename, contours):
+    if filename.lower().endswith('.dxf'):
+        writer = write_dxf
+    elif filename.lower().endswith('.svg'):
+        writer = write_svg
+    else:
+        raise ValueError(f'{filename}: only .dxf and .svg plates are supported')
+
+    stream = io.StringIO()
+    writer(stream, contours)
+    with open(filename, 'w', newline='\n') as f:
+        f.write(stream.getvalue())
+
+
+if __name__ == '__main__':
+    from kle import _option, parse, place, switch_class
+
+    parser = argparse.ArgumentParser(
+        description='Write the switch plate of a keyboard-layout-editor '
+                    'layout as DXF or SVG.',
+        usage='%(prog)s [options] layout.json')
+
+    parser.add_argument('layout', type=str,
+                        help='KLE JSON layout (Download JSON)')
+
+    parser.add_argument('-o', '--output',
+                        type=str, default=None,
+                        help='plate file, .dxf or .svg (default: the layout '
+                             'name with .dxf)')
+
+    parser.add_argument('-c', '--class',
+                        type=str, default='SwitchCherryMX', dest='cls',
+                        help='switch class (default: %(default)s)')
+
+    parser.add_argument('-O', '--option',
+                        type=_option, action='append', default=[],
+                        help='switch class parameter, e.g. switch_type=Plate')
+
+    parser.add_argument('--no-stabilizer',
+                        action='store_true',
+                        help='leave out the stabilizer cutouts')
+
+    args = parser.parse_args()
+
+    with open(args.layout) as f:
+        keys = parse(json.load(f))
+
+    cls, kwargs = switch_class(parser, args)
+    placements = place(keys, cls, kwargs, with_keycaps=False,
+                       stabilizers=not args.no_stabilizer)
+    contours = plate_cutouts(placements)
+
+    output = args.output or os.path.splitext(args.layout)[0] + '.dxf'
+    write_plate(output, contours)
+    print(f'{len(contours)} contours written to {output}')
+
+    sys.exit(0)
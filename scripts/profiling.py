@@ -0,0 +1,87 @@
+import json
+import os
+import time
+import tracemalloc
+
+from util import PadGeometry, shared_childs
+
+
+def count_nodes(node):
+    # number of nodes per class, including virtual childs, in the same walk
+    # order as Node.serialize()
+    counts = {}
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        name = 'Pad' if isinstance(node, PadGeometry) \
+            else node.__class__.__name__
+        counts[name] = counts.get(name, 0) + 1
+        stack.extend(shared_childs(node))
+    return counts
+
+
+class FootprintTimer:
+    # Splits the wall time of one footprint into its stages and records its
+    # peak traced memory. tracemalloc is started on first use in each
+    # process, so profiled runs are slower than regular ones.
+
+    def __init__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.stats = {}
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.stats[stage] = now - self.last
+        self.last = now
+
+    def finish(self, footprint, size):
+        self.stats['bytes'] = size
+        self.stats['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        self.stats['nodes'] = count_nodes(footprint)
+        return self.stats
+
+
+class Profile:
+    # Collects FootprintTimer stats of a run, per footprint and per group
+
+    STAGES = ['build', 'check', 'serialize', 'write']
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.footprints = {}
+        self.groups = {}
+
+    def add(self, group, filename, stats):
+        self.footprints[filename] = dict(stats, group=group)
+
+        total = self.groups.setdefault(group, {
+            'footprints': 0, 'bytes': 0, 'peak_memory': 0, 'nodes': {},
+            **{stage: 0.0 for stage in self.STAGES}})
+        total['footprints'] += 1
+        total['bytes'] += stats['bytes']
+        total['peak_memory'] = max(total['peak_memory'], stats['peak_memory'])
+        for stage in self.STAGES:
+            total[stage] += stats[stage]
+        for name, count in stats['nodes'].items():
+            total['nodes'][name] = total['nodes'].get(name, 0) + count
+
+    def report(self):
+        total = {'wall': time.perf_counter() - self.started,
+                 'footprints': len(self.footprints),
+                 'bytes': sum(g['bytes'] for g in self.groups.values())}
+        for stage in self.STAGES:
+            total[stage] = sum(g[stage] for g in self.groups.values())
+        return {'total': total,
+                'groups': self.groups,
+                'footprints': self.footprints}
+
+    def save(self, filename):
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(filename, 'w') as f:
+            json.dump(self.report(), f, indent=1, sort_keys=True)
+            f.write('\n')
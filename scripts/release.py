@@ -0,0 +1,262 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import struct
+import sys
+import time
+import zlib
+
+try:
+    import cairosvg
+except ImportError:
+    cairosvg = None
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+NAME = 'keyswitch-kicad-library'
+
+# package directory -> library directory it is packed from
+LIBRARY_DIRS = {'footprints': os.path.join('library', 'footprints'),
+                '3dmodels': os.path.join('library', '3dmodels')}
+
+# versions keys only the repository metadata has, not the packaged one
+DOWNLOAD_KEYS = ['download_sha256', 'download_size', 'download_url',
+                 'install_size']
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_CENTRAL_HEADER = struct.Struct('<4s4B4H3L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+
+
+def _dos_time(timestamp):
+    t = time.gmtime(max(timestamp, 315532800))
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+class ZipWriter:
+    # Deterministic zip written front to back: every entry gets the same
+    # timestamp and permissions, and the archive is hashed and sized while
+    # it is written, so it never has to be read back. The stream is never
+    # seeked, entries are compressed before they are added.
+
+    def __init__(self, stream, timestamp=0):
+        self.stream = stream
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.install_size = 0
+        self.time, self.date = _dos_time(timestamp)
+        self.central = []
+
+    def _write(self, data):
+        self.stream.write(data)
+        self.sha256.update(data)
+        self.size += len(data)
+
+    def add(self, name, crc, size, method, data):
+        name = name.encode()
+        if self.size + len(data) > 0xffffffff:
+            raise ValueError('archives over 4GB are not supported')
+        offset = self.size
+        self._write(_LOCAL_HEADER.pack(
+            b'PK\x03\x04', 20, 0, method, self.time, self.date, crc,
+            len(data), size, len(name), 0) + name)
+        self._write(data)
+        self.central.append(_CENTRAL_HEADER.pack(
+            b'PK\x01\x02', 20, 3, 20, 0, 0, method, self.time, self.date,
+            crc, len(data), size, len(name), 0, 0, 0, 0, 0o100644 << 16,
+            offset) + name)
+        self.install_size += size
+
+    def close(self):
+        offset = self.size
+        for header in self.central:
+            self._write(header)
+        self._write(_END_RECORD.pack(
+            b'PK\x05\x06', 0, 0, len(self.central), len(self.central),
+            self.size - offset, offset, 0))
+        return self.sha256.hexdigest()
+
+
+def _compress(task):
+    # (crc, size, method, data) of a file or bytes, stored when deflating
+    # does not make it smaller
+    source, level = task
+    if isinstance(source, bytes):
+        data = source
+    else:
+        with open(source, 'rb') as f:
+            data = f.read()
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    packed = compressor.compress(data) + compressor.flush()
+    if len(packed) >= len(data):
+        return zlib.crc32(data), len(data), ZIP_STORED, data
+    return zlib.crc32(data), len(data), ZIP_DEFLATED, packed
+
+
+def library_files(root=ROOT):
+    # (name in the package, path) of every library file, sorted, leaving out
+    # hidden files such as the generator manifest
+    for package_dir, library_dir in LIBRARY_DIRS.items():
+        top = os.path.join(root, library_dir)
+        files = []
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for filename in filenames:
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, top).replace(os.sep, '/')
+                files.append((f'{package_dir}/{name}', path))
+        yield from sorted(files)
+
+
+def package_metadata(metadata, version):
+    # the metadata.json shipped in the package: only the released version,
+    # without its download details
+    entry = {k: v for k, v in version_entry(metadata, version).items()
+             if k not in DOWNLOAD_KEYS}
+    return dict(metadata, versions=[entry])
+
+
+def version_entry(metadata, version):
+    for entry in metadata['versions']:
+        if entry['version'] == version:
+            return entry
+    raise KeyError(f'version {version} is not in metadata.json')
+
+
+def write_package(filename, entries, jobs=1, level=9, timestamp=0):
+    # Packs (name, path or bytes) entries into filename, compressing them in
+    # jobs worker processes. Returns (sha256, download size, install size).
+    tasks = ((source, level) for name, source in entries)
+    names = (name for name, source in entries)
+
+    if jobs == 1:
+        results = map(_compress, tasks)
+    else:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap(_compress, tasks, chunksize=4)
+
+    tmp_filename = f'{filename}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_filename, 'wb') as f:
+            writer = ZipWriter(f, timestamp)
+            for name, result in zip(names, results):
+                writer.add(name, *result)
+            sha256 = writer.close()
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.unlink(tmp_filename)
+        raise
+    finally:
+        if jobs != 1:
+            pool.close()
+            pool.join()
+
+    return sha256, writer.size, writer.install_size
+
+
+def _dump(metadata):
+    return json.dumps(metadata, indent=4, ensure_ascii=False) + '\n'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Pack the library into a KiCad plugin and content '
+                    'manager package and record it in metadata.json.',
+        usage='%(prog)s [options]')
+
+    parser.add_argument('-o', '--output',
+                        type=str, default=os.path.join(ROOT, 'release'),
+                        help='output path (default: release)')
+
+    parser.add_argument('-v', '--version',
+                        type=str, default=None,
+                        help='version to release, added to metadata.json '
+                             'when it is new (default: the last version in '
+                             'metadata.json)')
+
+    parser.add_argument('--status',
+                        type=str, default='stable',
+                        help='status of a new version (default: %(default)s)')
+
+    parser.add_argument('--kicad-version',
+                        type=str, default='6.0',
+                        help='minimum KiCad version of a new version '
+                             '(default: %(default)s)')
+
+    parser.add_argument('--url',
+                        type=str, default=None,
+                        help='download_url of the package')
+
+    parser.add_argument('-j', '--jobs',
+                        type=int, default=1,
+                        help='number of compression processes, 0 uses all '
+                             'cores (default: %(default)s)')
+
+    parser.add_argument('--no-icon',
+                        action='store_true',
+                        help='pack without the icon, which needs cairosvg')
+
+    parser.add_argument('--dry-run',
+                        action='store_true',
+                        help='write the package but leave metadata.json '
+                             'alone')
+
+    args = parser.parse_args()
+
+    if cairosvg is None and not args.no_icon:
+        parser.error('cairosvg is required for the icon, install it with '
+                     'pip install cairosvg or pack without it with --no-icon')
+
+    metadata_filename = os.path.join(ROOT, 'metadata.json')
+    with open(metadata_filename) as f:
+        metadata = json.load(f)
+
+    version = args.version or metadata['versions'][-1]['version']
+    if not any(v['version'] == version for v in metadata['versions']):
+        metadata['versions'].append({'version': version,
+                                     'status': args.status,
+                                     'kicad_version': args.kicad_version})
+
+    entries = list(library_files())
+    if not args.no_icon:
+        icon = cairosvg.svg2png(url=os.path.join(ROOT, 'assets', 'icon.svg'),
+                                output_width=64, output_height=64)
+        entries.append(('resources/icon.png', icon))
+    entries.append(('metadata.json',
+                    _dump(package_metadata(metadata, version)).encode()))
+
+    # SOURCE_DATE_EPOCH pins the entry timestamps of reproducible builds
+    timestamp = int(os.environ.get('SOURCE_DATE_EPOCH', 0))
+
+    os.makedirs(args.output, exist_ok=True)
+    filename = os.path.join(args.output, f'{NAME}-{version}.zip')
+    sha256, download_size, install_size = write_package(
+        filename, entries, jobs=args.jobs or os.cpu_count(),
+        timestamp=timestamp)
+
+    entry = version_entry(metadata, version)
+    entry['download_sha256'] = sha256
+    entry['download_size'] = download_size
+    entry['install_size'] = install_size
+    if args.url:
+        entry['download_url'] = args.url
+
+    if not args.dry_run:
+        with open(metadata_filename, 'w', newline='\n') as f:
+            f.write(_dump(metadata))
+
+    print(f'{len(entries)} files packed into {filename}')
+    print(f'"download_sha256": "{sha256}"')
+    print(f'"download_size": {download_size}')
+    print(f'"install_size": {install_size}')
+
+    sys.exit(0)
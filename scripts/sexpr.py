@@ -0,0 +1,174 @@
+import mmap
+import re
+
+_TOKEN = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+
+
+def tokenize(text):
+    # yields '(' and ')' as is, and every atom as a str, quoted atoms
+    # unescaped. ( and ) inside quotes are returned as atoms, not brackets.
+    pos = 0
+    end = len(text)
+    while pos < end:
+        match = _TOKEN.match(text, pos)
+        if match is None:
+            if text[pos:].strip():
+                raise ValueError(f'invalid s-expression at offset {pos}')
+            return
+        pos = match.end()
+        if match.group(1):
+            yield '('
+        elif match.group(2):
+            yield ')'
+        elif match.group(3) is not None:
+            yield _Atom(match.group(3).replace('\\"', '"'))
+        else:
+            yield _Atom(match.group(4))
+
+
+class _Atom(str):
+    # distinguishes a quoted "(" or ")" atom from a bracket
+    pass
+
+
+def parse(text):
+    # parse a single s-expression into nested lists of str
+    stack = [[]]
+    for token in tokenize(text):
+        if type(token) is _Atom:
+            stack[-1].append(str(token))
+        elif token == '(':
+            stack.append([])
+        else:
+            if len(stack) == 1:
+                raise ValueError('unbalanced ")"')
+            node = stack.pop()
+            stack[-1].append(node)
+    if len(stack) != 1:
+        raise ValueError('missing ")"')
+    if len(stack[0]) != 1:
+        raise ValueError(f'expected one s-expression, found {len(stack[0])}')
+    return stack[0][0]
+
+
+_BTOKEN = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+_BBRACKET = re.compile(rb'\(|\)|"(?:[^"\\]|\\.)*"')
+_BSPACE = re.compile(rb'\s*')
+
+
+def _atom(value):
+    return value.decode().replace('\\"', '"')
+
+
+def parse_form(buf, pos):
+    # Parses the s-expression starting at the '(' at or after pos in buf, a
+    # bytes like object. Returns the nested lists and the offset after it.
+    stack = []
+    while True:
+        match = _BTOKEN.match(buf, pos)
+        if match is None:
+            raise ValueError(f'invalid s-expression at offset {pos}')
+        pos = match.end()
+        if match.group(1):
+            stack.append([])
+        elif match.group(2):
+            if not stack:
+                raise ValueError(f'unbalanced ")" at offset {pos - 1}')
+            node = stack.pop()
+            if not stack:
+                return node, pos
+            stack[-1].append(node)
+        elif not stack:
+            raise ValueError(f'expected "(" at offset {match.start()}')
+        elif match.group(3) is not None:
+            stack[-1].append(_atom(match.group(3)))
+        else:
+            stack[-1].append(match.group(4).decode())
+
+
+def skip_form(buf, pos):
+    # Returns the offset after the s-expression starting at the '(' at or
+    # after pos in buf, without building it
+    depth = 0
+    for match in _BBRACKET.finditer(buf, pos):
+        bracket = match.group()
+        if bracket == b'(':
+            depth += 1
+        elif bracket == b')':
+            depth -= 1
+            if depth == 0:
+                return match.end()
+    raise ValueError('missing ")"')
+
+
+class Reader:
+    # Streams the forms below the root of a .kicad_mod or .kicad_pcb file.
+    # The file is memory mapped and only the forms asked for are parsed,
+    # everything else is skipped bracket by bracket, so even large boards
+    # are read in constant memory:
+    #
+    #   with Reader('demo.kicad_pcb') as pcb:
+    #       for footprint in pcb.forms(['footprint', 'module']):
+    #           ...
+    #
+    # root holds the head of the root form and the atoms following it, e.g.
+    # ['module', 'SW_Cherry_MX_PCB'] or ['kicad_pcb'].
+
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+        try:
+            self.buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            self.buf = b''
+
+        self.root = []
+        match = _BTOKEN.match(self.buf, 0)
+        if match is None or not match.group(1):
+            self.close()
+            raise ValueError(f'{filename} is not an s-expression')
+        self._start = match.end()
+
+        # the root head and its leading atoms
+        while True:
+            match = _BTOKEN.match(self.buf, self._start)
+            if match is None or match.group(1) or match.group(2):
+                break
+            self.root.append(_atom(match.group(3)) if match.group(3) is not None
+                             else match.group(4).decode())
+            self._start = match.end()
+
+    def forms(self, kinds=None):
+        # yields the child forms of the root, as nested lists, optionally
+        # only those whose head is in kinds
+        pos = self._start
+        buf = self.buf
+        while True:
+            match = _BTOKEN.match(buf, pos)
+            if match is None:
+                raise ValueError(f'invalid s-expression at offset {pos}')
+            if match.group(2):
+                return
+            if not match.group(1):
+                # atoms between forms, e.g. hide
+                pos = match.end()
+                continue
+
+            head = _BTOKEN.match(buf, match.end())
+            kind = head.group(4) or head.group(3) if head else None
+            if kinds is None or (kind is not None and kind.decode() in kinds):
+                form, pos = parse_form(buf, match.start())
+                yield form
+            else:
+                pos = skip_form(buf, match.start())
+
+    def close(self):
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
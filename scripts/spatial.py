@@ -0,0 +1,270 @@
+import math
+
+# coordinates are compared on a 1nm grid
+EPS = 1e-6
+
+
+def key(point):
+    return round(point[0], 6), round(point[1], 6)
+
+
+def rotate(x, y, angle):
+    # KiCad rotation, counter-clockwise on screen with y pointing down
+    if not angle:
+        return x, y
+    a = math.radians(angle)
+    return (x * math.cos(a) + y * math.sin(a),
+            -x * math.sin(a) + y * math.cos(a))
+
+
+def area(polygon):
+    return sum(p[0] * q[1] - q[0] * p[1]
+               for p, q in edges(polygon)) / 2
+
+
+def chain(segments):
+    # closed loops out of (start, end) segments, open chains are dropped
+    outgoing = {}
+    for start, end in segments:
+        outgoing.setdefault(key(start), []).append((start, end))
+
+    loops = []
+    while outgoing:
+        first = next(iter(outgoing))
+        loop = []
+        point = first
+        while point in outgoing:
+            start, end = outgoing[point].pop()
+            if not outgoing[point]:
+                del outgoing[point]
+            loop.append(start)
+            point = key(end)
+            if point == first:
+                loops.append(loop)
+                break
+    return loops
+
+
+def loops(segments):
+    # closed loops out of segments drawn in any direction, open chains are
+    # dropped
+    ends = {}
+    for i, (a, b) in enumerate(segments):
+        ends.setdefault(key(a), []).append(i)
+        ends.setdefault(key(b), []).append(i)
+
+    used = set()
+    result = []
+    for i, (a, b) in enumerate(segments):
+        if i in used:
+            continue
+        used.add(i)
+        loop = [a]
+        first = key(a)
+        point = b
+        while key(point) != first:
+            following = [j for j in ends[key(point)] if j not in used]
+            if not following:
+                loop = None
+                break
+            used.add(following[0])
+            loop.append(point)
+            start, end = segments[following[0]]
+            point = end if key(start) == key(point) else start
+        if loop and len(loop) >= 3:
+            result.append(loop)
+    return result
+
+
+def arc_points(center, start, angle, step=10):
+    # points along an arc of angle degrees from start, at most step degrees
+    # apart, y pointing down like KiCad
+    n = max(1, math.ceil(abs(angle) / step))
+    dx, dy = start[0] - center[0], start[1] - center[1]
+    points = []
+    for i in range(n + 1):
+        a = math.radians(angle * i / n)
+        points.append((center[0] + dx * math.cos(a) - dy * math.sin(a),
+                       center[1] + dx * math.sin(a) + dy * math.cos(a)))
+    return points
+
+
+def node_segments(node_type, node):
+    # straight segments along a Line, Arc or Circle node
+    if node_type == 'Line':
+        return [((node.start_pos.x, node.start_pos.y),
+                 (node.end_pos.x, node.end_pos.y))]
+    if node_type == 'Arc':
+        points = arc_points((node.center_pos.x, node.center_pos.y),
+                            (node.start_pos.x, node.start_pos.y), node.angle)
+    elif node_type == 'Circle':
+        points = arc_points((node.center_pos.x, node.center_pos.y),
+                            (node.center_pos.x + node.radius,
+                             node.center_pos.y), 360)
+    else:
+        return []
+    return list(zip(points, points[1:]))
+
+
+def simplify(loop):
+    # drops points in the middle of straight runs
+    result = []
+    n = len(loop)
+    for i, p in enumerate(loop):
+        a, b = loop[i - 1], loop[(i + 1) % n]
+        cross = (p[0] - a[0]) * (b[1] - p[1]) - (p[1] - a[1]) * (b[0] - p[0])
+        if abs(cross) > EPS:
+            result.append(p)
+    return result
+
+
+def on_segment(m, p, q):
+    # distance of m to segment pq below EPS
+    dx, dy = q[0] - p[0], q[1] - p[1]
+    length2 = dx * dx + dy * dy
+    t = ((m[0] - p[0]) * dx + (m[1] - p[1]) * dy) / length2
+    if t < -EPS or t > 1 + EPS:
+        return False
+    cross = (m[0] - p[0]) * dy - (m[1] - p[1]) * dx
+    return cross * cross <= EPS * EPS * length2
+
+
+def edges(polygon):
+    return zip(polygon, polygon[1:] + polygon[:1])
+
+
+def inside(m, polygon):
+    result = False
+    for p, q in edges(polygon):
+        if (p[1] > m[1]) != (q[1] > m[1]):
+            x = p[0] + (m[1] - p[1]) * (q[0] - p[0]) / (q[1] - p[1])
+            if x > m[0]:
+                result = not result
+    return result
+
+
+def splits(p, q, polygon):
+    # parameters along pq where it crosses or touches the edges of polygon
+    params = []
+    dx, dy = q[0] - p[0], q[1] - p[1]
+    length2 = dx * dx + dy * dy
+    for r, s in edges(polygon):
+        ex, ey = s[0] - r[0], s[1] - r[1]
+        d = dx * ey - dy * ex
+        wx, wy = r[0] - p[0], r[1] - p[1]
+        if abs(d) > EPS * EPS:
+            t = (wx * ey - wy * ex) / d
+            u = (wx * dy - wy * dx) / d
+            if -EPS <= t <= 1 + EPS and -EPS <= u <= 1 + EPS:
+                params.append(t)
+        elif abs(wx * dy - wy * dx) <= EPS * math.sqrt(length2):
+            # collinear edges, split at the ends of the overlap
+            for e in (r, s):
+                params.append(((e[0] - p[0]) * dx + (e[1] - p[1]) * dy)
+                              / length2)
+    return [t for t in params if EPS < t < 1 - EPS]
+
+
+def _enters(a, b):
+    # whether a piece of an edge of a lies inside b, or on an edge of b with
+    # b on the same side
+    for p, q in edges(a):
+        params = sorted(set([0, 1] + splits(p, q, b)))
+        for t0, t1 in zip(params, params[1:]):
+            if t1 - t0 <= EPS:
+                continue
+            t = (t0 + t1) / 2
+            m = (p[0] + (q[0] - p[0]) * t, p[1] + (q[1] - p[1]) * t)
+            shared = next((e for e in edges(b) if on_segment(m, *e)), None)
+            if shared is None:
+                if inside(m, b):
+                    return True
+            elif ((q[0] - p[0]) * (shared[1][0] - shared[0][0]) +
+                  (q[1] - p[1]) * (shared[1][1] - shared[0][1])) > 0:
+                return True
+    return False
+
+
+def polygons_overlap(a, b):
+    # whether the interiors of two positively oriented polygons overlap,
+    # polygons touching at an edge or corner do not
+    return _enters(a, b) or _enters(b, a)
+
+
+def bbox(points):
+    xs, ys = zip(*points)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def overlaps(a, b):
+    # bounding boxes touching at an edge count as overlapping
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class GridIndex:
+    # Uniform grid of bounding boxes. Key sized cells keep the number of
+    # boxes per cell small for keyboard layouts, so finding the neighbours of
+    # every item is close to linear in the number of items.
+
+    def __init__(self, cell=19.05):
+        self.cell = cell
+        self.cells = {}
+        self.boxes = []
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _cells(self, box):
+        c = self.cell
+        for i in range(math.floor(box[0] / c), math.floor(box[2] / c) + 1):
+            for j in range(math.floor(box[1] / c), math.floor(box[3] / c) + 1):
+                yield i, j
+
+    def insert(self, box):
+        # adds a bounding box (x0, y0, x1, y1), returns its index
+        index = len(self.boxes)
+        self.boxes.append(box)
+        for cell in self._cells(box):
+            self.cells.setdefault(cell, []).append(index)
+        return index
+
+    def query(self, box):
+        # indexes of the boxes overlapping box
+        found = set()
+        for cell in self._cells(box):
+            for index in self.cells.get(cell, []):
+                if index not in found and overlaps(self.boxes[index], box):
+                    found.add(index)
+        return sorted(found)
+
+    def pairs(self):
+        # (a, b) index pairs with a < b of every two overlapping boxes
+        seen = set()
+        for items in self.cells.values():
+            for n, a in enumerate(items):
+                for b in items[n + 1:]:
+                    pair = (a, b) if a < b else (b, a)
+                    if pair not in seen and overlaps(self.boxes[a],
+                                                     self.boxes[b]):
+                        seen.add(pair)
+        return sorted(seen)
+
+    def clusters(self):
+        # groups of indexes connected through overlapping boxes
+        parent = list(range(len(self.boxes)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for a, b in self.pairs():
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+
+        groups = {}
+        for i in range(len(self.boxes)):
+            groups.setdefault(find(i), []).append(i)
+        return list(groups.values())
@@ -1,3 +1,4 @@
+from copy import copy
 from os import path
 from typing import Union
 
@@ -17,10 +18,21 @@ class Switch(Footprint):
     def __init__(self, name: str, description: str, tags: str,
                  cutout: bool = False, keycap: Keycap = None,
                  path3d: str = None, model3d: Union[str, list[str]] = None,
-                 text_offset: float = 8):
+                 model3d_ext: str = None, model3d_suffix: str = None,
+                 text_offset: float = 8, lazy: bool = False):
 
         Footprint.__init__(self, None)
 
+        # A lazy footprint only computes its name, description, tags and
+        # attributes here, the _build() steps making its nodes run when
+        # they are first needed.
+        self._pending = [] if lazy else None
+        # names of the _build() steps, which derive()d footprints run again
+        # when they need nodes of their own
+        self._steps = []
+        # the switch a derive()d footprint reads its nodes from
+        self._prototype = None
+
         self.name = name
         self.description = description
         self.tags = tags
@@ -33,6 +45,13 @@ class Switch(Footprint):
                 self.path3d = [model3d]
             else:
                 self.path3d = model3d
+            # e.g. wrz for the gzipped models of vrml.py --wrz and _LOD for
+            # the low detail models of lod.py
+            if model3d_ext is not None or model3d_suffix is not None:
+                self.path3d = [
+                    path.splitext(f)[0] + (model3d_suffix or '') +
+                    (f'.{model3d_ext}' if model3d_ext else path.splitext(f)[1])
+                    for f in self.path3d]
             if path3d is not None:
                 self.path3d = list(
                     map(lambda f: path.join(path3d, f), self.path3d)
@@ -50,7 +69,85 @@ class Switch(Footprint):
 
         self.name.replace(' ', '_')
 
-        self._init_generic_nodes()
+        self._build(self._init_generic_nodes)
+
+    def _build(self, init):
+        self._steps.append(init.__name__)
+        if self._pending is None:
+            init()
+        else:
+            self._pending.append(init)
+
+    def getNormalChilds(self):
+        if self._pending:
+            pending, self._pending = self._pending, None
+            for init in pending:
+                init()
+        return Footprint.getNormalChilds(self)
+
+    # the node API builds pending nodes first, so nodes keep their order
+    def append(self, node):
+        self.getNormalChilds()
+        Footprint.append(self, node)
+
+    def extend(self, nodes):
+        self.getNormalChilds()
+        Footprint.extend(self, nodes)
+
+    def remove(self, node):
+        self.getNormalChilds()
+        Footprint.remove(self, node)
+
+    def insert(self, node):
+        self.getNormalChilds()
+        Footprint.insert(self, node)
+
+    def derive(self, keycap: Keycap = None):
+        # The same footprint as building this switch with keycap, without
+        # building it again. The new footprint reads the nodes of this
+        # switch (see getSharedChilds) until its nodes are used through the
+        # node API, which first builds nodes of its own. This switch is only
+        # read afterwards and must not be changed itself.
+        self.getNormalChilds()
+
+        variant = copy(self)
+        variant._prototype = self
+        variant._childs = []
+        variant._pending = [variant._init_derived_nodes]
+        variant._value = None
+        variant.keycap = keycap
+        if keycap is not None:
+            variant.name = f'{self.name}_{keycap.name}'
+            variant.description = f'{self.description} with {keycap.tags} keycap'
+            variant.tags = f'{self.tags} {keycap.tags}'
+            variant._value = Text(type='value', text=variant.name,
+                                  at=[0, self.text_offset], layer='F.Fab')
+        return variant
+
+    def getSharedChilds(self):
+        # the nodes to read of a derived footprint: the ones of its
+        # prototype, with its own value text and keycap
+        if self._pending and self._prototype is not None:
+            return self._derived_nodes()
+        return self.getAllChilds()
+
+    def _derived_nodes(self):
+        nodes = []
+        for node in self._prototype.getNormalChilds():
+            if self._value is not None and isinstance(node, Text) \
+                    and node.type == 'value':
+                node = self._value
+            nodes.append(node)
+        if self.keycap is not None:
+            nodes.append(self.keycap)
+        return nodes
+
+    def _init_derived_nodes(self):
+        # the build steps of the prototype, making the same nodes with the
+        # name and keycap of this footprint
+        self._prototype = self._value = None
+        for step in self._steps:
+            getattr(self, step)()
 
     def _init_generic_nodes(self):
         # add general values
@@ -143,7 +240,9 @@ class StabilizerCherryMX(Switch):
                  description: str = 'Cherry MX PCB Stabilizer',
                  tags: str = 'Cherry MX Keyboard Stabilizer',
                  cutout: bool = True, keycap: Keycap = None,
-                 path3d: str = None, model3d: Union[str, list[str]] = None):
+                 path3d: str = None, model3d: Union[str, list[str]] = None,
+                 model3d_ext: str = None, model3d_suffix: str = None,
+                 lazy: bool = False):
 
         if size is None or size not in self.lu_table:
             raise Exception(f'{size} is not a valid size')
@@ -162,18 +261,20 @@ class StabilizerCherryMX(Switch):
                         path3d=path3d,
                         model3d=model3d if model3d is not None
                         else f'{_name}.wrl',
-                        text_offset=2)
+                        model3d_ext=model3d_ext,
+                        model3d_suffix=model3d_suffix,
+                        text_offset=2, lazy=lazy)
+
+        # set attributes
+        self.setAttribute('virtual')
 
-        self._init_base()
+        self._build(self._init_base)
 
         if cutout is True:
-            self._init_cutout()
+            self._build(self._init_cutout)
 
     def _init_base(self):
 
-        # set attributes
-        self.setAttribute('virtual')
-
         # add pads
         small_hole_size = 3.048
         large_hole_size = 3.9878
@@ -233,7 +334,7 @@ class SwitchAlpsMatias(Switch):
             model3d=model3d,
             **kwargs)
 
-        self._init_switch()
+        self._build(self._init_switch)
 
     # disable default Switch features we don't use
     def _init_center_hole(self):
@@ -325,7 +426,7 @@ class SwitchCherryMX(CherryMXBase, Switch):
             model3d=model3d if model3d else f'{_name}.wrl',
             **kwargs)
 
-        self._init_switch()
+        self._build(self._init_switch)
 
     def _init_pcb_mount_holes(self):
         if self.switch_type == 'PCB':
@@ -371,7 +472,7 @@ class SwitchHybridCherryMxAlps(Switch, CherryMXBase):
             model3d=model3d,
             **kwargs)
 
-        self._init_switch()
+        self._build(self._init_switch)
 
     def _init_fab_outline(self):
         self.append(PolygoneLine(polygone=self.base_polyline, layer='F.Fab'))
@@ -591,7 +692,7 @@ class SwitchKailhChoc(Switch, HotswapBase):
             self.center_hole_dia = 5.05
         else:
             self.center_hole_dia = 3.45
-        self._init_switch()
+        self._build(self._init_switch)
 
     def _init_fab_outline(self):
         super()._init_fab_outline()
@@ -666,7 +767,7 @@ class SwitchKailhChocMini(Switch):
             text_offset=8.5,
             **kwargs)
 
-        self._init_switch()
+        self._build(self._init_switch)
 
     def _init_center_hole(self):
         polyline = [
@@ -721,7 +822,7 @@ class SwitchKailhKH(Switch):
             model3d=model3d,
             **kwargs)
 
-        self._init_switch()
+        self._build(self._init_switch)
 
 
 # http://www.kailh.com/en/Products/Ks/NotebookS/
@@ -753,7 +854,7 @@ class SwitchKailhNB(Switch):
             text_offset=8.5,
             **kwargs)
 
-        self._init_switch()
+        self._build(self._init_switch)
 
     def _init_center_hole(self):
         self.append(RectLine(start=[1.1, -2.5], end=[-2.9, 2.5],
@@ -795,7 +896,7 @@ class SwitchHotswapKailh(HotswapBase, CherryMXBase, Switch):
             **kwargs)
 
         self.setAttribute('smd')
-        self._init_switch()
+        self._build(self._init_switch)
 
     def _init_fab_outline(self):
         super()._init_fab_outline()
@@ -0,0 +1,37 @@
+import os
+import re
+
+from KicadModTree.KicadFileHandler import KicadFileHandler
+
+from conftest import SCRIPTS
+from emitter import SwitchFileHandler
+from keyswitch_generator import build_footprint, plan
+
+LIBRARY = os.path.join(SCRIPTS, '..', 'library', 'footprints')
+
+# the installed KicadModTree leaves out drill offsets, which the version the
+# library was generated with writes (Hybrid pads)
+_DRILL_OFFSET = re.compile(r' \(offset [^)]*\)')
+
+
+def _variants():
+    # every family without keycap and with one keycap
+    return list(plan(keys=['none', '2.25u90', 'ISOEnter']))
+
+
+def test_serialize_matches_kicad_file_handler():
+    for variant in _variants():
+        footprint = build_footprint(variant)
+        output = SwitchFileHandler(footprint).serialize(timestamp=0)
+        assert _DRILL_OFFSET.sub('', output) == \
+            KicadFileHandler(footprint).serialize(timestamp=0)
+
+
+def test_write_file_matches_library(tmp_path):
+    for variant in _variants():
+        footprint = build_footprint(variant)
+        filename = tmp_path / f'{footprint.name}.kicad_mod'
+        SwitchFileHandler(footprint).writeFile(str(filename), timestamp=0)
+        with open(os.path.join(LIBRARY, f'{variant[0]}.pretty',
+                               filename.name)) as f:
+            assert filename.read_text() == f.read()
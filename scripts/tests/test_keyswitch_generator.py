@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+
+from KicadModTree.nodes.base import Text
+
+from conftest import SCRIPTS
+from emitter import SwitchFileHandler
+from keyswitch_generator import build_footprint, plan
+from manifest import MANIFEST_NAME
+
+
+def _generate(output, *args):
+    return subprocess.run(
+        [sys.executable, os.path.join(SCRIPTS, 'keyswitch_generator.py'),
+         '-o', str(output), '-j', '1', *args],
+        capture_output=True, text=True, cwd=SCRIPTS)
+
+
+def test_main_saves_manifest(tmp_path):
+    result = _generate(tmp_path, '-c', 'SwitchAlpsMatias')
+    assert result.returncode == 0, result.stderr
+    with open(tmp_path / MANIFEST_NAME) as f:
+        assert json.load(f)
+
+    # the second run skips every footprint the manifest knows
+    result = _generate(tmp_path, '-c', 'SwitchAlpsMatias')
+    assert result.returncode == 0, result.stderr
+    assert '0 footprints written' in result.stdout
+
+
+def test_changing_a_footprint_keeps_later_builds():
+    variants = list(plan(classes=['SwitchCherryMX'],
+                         keys=['none', '1u', 'ISOEnter']))
+
+    def outputs():
+        return [SwitchFileHandler(build_footprint(v)).serialize(timestamp=0)
+                for v in variants]
+
+    before = outputs()
+    for variant in variants:
+        footprint = build_footprint(variant)
+        footprint.name = 'X'
+        footprint.append(Text(type='user', text='added', at=[0, 0],
+                              layer='F.Fab'))
+        for node in footprint.getNormalChilds():
+            assert node.getParent() is footprint
+            if isinstance(node, Text):
+                node.text = 'changed'
+                node.at.x += 1
+
+    assert outputs() == before
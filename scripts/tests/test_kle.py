@@ -0,0 +1,28 @@
+import argparse
+
+import pytest
+
+from kle import _option, switch_class
+
+
+def _parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--class', default='SwitchCherryMX', dest='cls')
+    parser.add_argument('-O', '--option', type=_option, action='append',
+                        default=[])
+    return parser
+
+
+def test_switch_class_lists_valid_options(capsys):
+    parser = _parser()
+    with pytest.raises(SystemExit):
+        switch_class(parser, parser.parse_args([]))
+    assert '-O switch_type=PCB' in capsys.readouterr().err
+
+
+def test_switch_class():
+    parser = _parser()
+    cls, kwargs = switch_class(parser, parser.parse_args(
+        ['-O', 'switch_type=PCB']))
+    assert cls.__name__ == 'SwitchCherryMX'
+    assert kwargs == {'switch_type': 'PCB'}
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from conftest import SCRIPTS
+from library_index import FootprintIndex, build
+
+LIBRARY = os.path.join(SCRIPTS, '..', 'library', 'footprints')
+
+
+def test_stabilizers_have_no_keycap(tmp_path):
+    index_path = str(tmp_path / 'index.sqlite')
+    build(LIBRARY, index_path)
+
+    with FootprintIndex(index_path) as index:
+        stabilizers = index.find(library='Mounting_Keyboard_Stabilizer')
+        assert stabilizers
+        assert all(row['keycap_width'] is None and row['keycap'] is None
+                   for row in stabilizers)
+        assert not [row for row in index.find(min_keycap=2)
+                    if row['library'] == 'Mounting_Keyboard_Stabilizer']
+
+        row, = index.find(name='SW_Cherry_MX_PCB_1.25u_90deg')
+        assert (row['keycap'], row['keycap_width'],
+                row['keycap_rotation']) == ('1.25u 90deg', 1.25, 90)
+
+
+def test_failed_build_leaves_no_files(tmp_path):
+    library = tmp_path / 'library'
+    (library / 'Broken.pretty').mkdir(parents=True)
+    (library / 'Broken.pretty' / 'Broken.kicad_mod').write_text(
+        '(footprint "Broken" (pad "1" thru_hole circle (at 0 0)')
+    index_path = tmp_path / 'index.sqlite'
+    index_path.write_bytes(b'previous index')
+
+    with pytest.raises(ValueError):
+        build(str(library), str(index_path))
+
+    assert sorted(os.listdir(tmp_path)) == ['index.sqlite', 'library']
+    assert index_path.read_bytes() == b'previous index'
@@ -0,0 +1,17 @@
+import json
+import os
+
+import lod
+import vrml
+
+
+def test_committed_cache_is_current():
+    with open(os.path.join(lod.MODELS_PATH, lod.CACHE_NAME)) as f:
+        cache = json.load(f)
+
+    assert cache
+    for target, digest in cache.items():
+        model = os.path.join(lod.MODELS_PATH,
+                             target.replace(lod.SUFFIX, '', 1))
+        assert lod.source_digest(model, lod.TRIANGLES,
+                                 vrml.DECIMALS) == digest, target
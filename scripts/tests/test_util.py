@@ -0,0 +1,80 @@
+import pytest
+from KicadModTree.Vector import Vector2D
+from KicadModTree.nodes.Footprint import Footprint
+
+from emitter import SwitchFileHandler
+from keycap import Keycap
+from switch import SwitchCherryMX
+from util import SwitchMountHole, SwitchPad, offset_polys
+
+
+def _pads(footprint):
+    return [node for node_type, node in SwitchFileHandler(footprint).nodes()
+            if node_type == 'Pad']
+
+
+def test_cached_pads_are_not_shared():
+    a = SwitchPad(number=1, shape='circle', at=[1, 2], size=2, drill=1.5)
+    b = SwitchPad(number=1, shape='circle', at=[1, 2], size=2, drill=1.5)
+    pad = a.getVirtualChilds()[0]
+    pad.at.x += 5
+    pad.layers.append('F.SilkS')
+    Footprint('other').append(pad)
+
+    for other in [a, b]:
+        pad = other.getVirtualChilds()[0]
+        assert pad.at == Vector2D(1, 2)
+        assert 'F.SilkS' not in pad.layers
+        assert pad.getParent() is None
+
+    hole = SwitchMountHole(at=[0, 0], drill=4)
+    hole.getVirtualChilds()[0].size.x = 10
+    assert SwitchMountHole(at=[0, 0], drill=4).getVirtualChilds()[0].size.x == 4
+
+    keycap = Keycap(keycap_type='regular', spacing=19.05, width=1)
+    keycap.getVirtualChilds()[0].layer = 'F.SilkS'
+    assert keycap.getSharedChilds()[0].layer == 'Dwgs.User'
+
+
+def test_changing_a_footprint_pad_keeps_the_others():
+    a = SwitchCherryMX(switch_type='PCB')
+    b = SwitchCherryMX(switch_type='PCB')
+    before = SwitchFileHandler(b).serialize(timestamp=0)
+
+    # the switches share the cached pads, which can not be changed
+    nodes = [node for node in a.getNormalChilds()
+             if isinstance(node, (SwitchPad, SwitchMountHole))]
+    others = [node for node in b.getNormalChilds()
+              if isinstance(node, (SwitchPad, SwitchMountHole))]
+    assert all(node.pads is other.pads for node, other in zip(nodes, others))
+    for pad in _pads(a):
+        with pytest.raises(AttributeError):
+            pad.at.y += 1
+        with pytest.raises(AttributeError):
+            pad.number = 9
+        with pytest.raises(AttributeError):
+            pad.layers.append('F.SilkS')
+
+    # Pad nodes of a are its own
+    for node in nodes:
+        for pad in node.getVirtualChilds():
+            pad.at.y += 1
+            pad.number = 9
+            pad.layers.append('F.SilkS')
+            a.append(pad)
+
+    assert SwitchFileHandler(b).serialize(timestamp=0) == before
+
+
+def test_offset_polys_open_polyline():
+    # an open L, the end points move along the normal of their segment
+    # only, so the offset end segments stay parallel to the original ones
+    (start, corner, end), = offset_polys([[(0, 0), (10, 0), (10, 10)]], 1)
+    assert start[0] == 0 and start[1] == corner[1] < 0
+    assert end[1] == 10 and end[0] == corner[0] > 10
+
+    # closed and wrapped open polylines bend the ends towards each other
+    wrapped, = offset_polys([[(0, 0), (10, 0), (10, 10)]], 1, wrap_open=True)
+    closed, = offset_polys([[(0, 0), (10, 0), (10, 10), (0, 0)]], 1)
+    assert wrapped == closed[:-1]
+    assert wrapped[0][0] < 0 and wrapped[2][1] > 10
@@ -1,25 +1,150 @@
 from KicadModTree.nodes.Node import Node
 from KicadModTree.nodes.base import Pad
 from KicadModTree.Vector import Vector2D
+from collections import namedtuple
+from functools import lru_cache
 from math import sqrt
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _frozen(kwargs):
+    # hashable form of pad parameters, Vector2D and lists become tuples
+    items = []
+    for key, value in sorted(kwargs.items()):
+        if isinstance(value, Vector2D):
+            value = (value.x, value.y)
+        elif isinstance(value, list):
+            value = tuple(value)
+        items.append((key, value))
+    return tuple(items)
+
+
+def _vector(value):
+    return Vector2D(value, value) if type(value) in [int, float] else Vector2D(value)
 
-class SwitchMountHole(Node):
-    def __init__(self, **kwargs):
-        Node.__init__(self)
-        kwargs.__setitem__('type', Pad.TYPE_NPTH)
-        kwargs.__setitem__('shape', kwargs.get('shape', Pad.SHAPE_CIRCLE))
-        kwargs.__setitem__('layers', Pad.LAYERS_NPTH)
-        if kwargs.get('size', None) is None:
-            drill = kwargs.get('drill')
-            kwargs.__setitem__('size', Vector2D(drill, drill) if type(drill) in [int, float] else Vector2D(drill))
-        self.virtual_childs = [Pad(**kwargs)]
+
+# x, y of PadGeometry positions and sizes
+Point = namedtuple('Point', ['x', 'y'])
+
+
+class PadGeometry(namedtuple('PadGeometry', [
+        'number', 'type', 'shape', 'at', 'rotation', 'size', 'drill',
+        'offset', 'layers', 'radius_ratio', 'solder_mask_margin',
+        'solder_paste_margin_ratio', 'solder_paste_margin', 'kwargs'])):
+    # Immutable pad with the attributes of a KicadModTree Pad that the
+    # serializers and design rule checks read. Switches with the same pads
+    # share them, node() makes the Pad it describes.
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, kwargs):
+        pad = Pad(**kwargs)
+        return cls(pad.number, pad.type, pad.shape,
+                   Point(pad.at.x, pad.at.y), pad.rotation,
+                   Point(pad.size.x, pad.size.y),
+                   Point(pad.drill.x, pad.drill.y) if pad.drill else None,
+                   Point(pad.offset.x, pad.offset.y), tuple(pad.layers),
+                   pad.radius_ratio, pad.solder_mask_margin,
+                   pad.solder_paste_margin_ratio, pad.solder_paste_margin,
+                   _frozen(kwargs))
+
+    def node(self):
+        kwargs = dict(self.kwargs)
+        kwargs['layers'] = list(kwargs['layers'])
+        return Pad(**kwargs)
+
+    def getSharedChilds(self):
+        return ()
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+# Pads only depend on their parameters, a board of thousands of the same
+# switch keeps one set of them.
+@lru_cache(maxsize=1024, typed=True)
+def _mount_hole_pads(items):
+    kwargs = dict(items)
+    kwargs['type'] = Pad.TYPE_NPTH
+    kwargs['shape'] = kwargs.get('shape', Pad.SHAPE_CIRCLE)
+    kwargs['layers'] = Pad.LAYERS_NPTH
+    if kwargs.get('size', None) is None:
+        kwargs['size'] = _vector(kwargs.get('drill'))
+    return (PadGeometry.of(kwargs),)
+
+
+@lru_cache(maxsize=1024, typed=True)
+def _switch_pads(pad_type, items):
+    kwargs = dict(items)
+    pads = []
+
+    if pad_type == SwitchPad.TYPE_REGULAR:
+        kwargs['type'] = Pad.TYPE_THT
+        kwargs['layers'] = Pad.LAYERS_THT
+        pads.append(PadGeometry.of(kwargs))
+
+    elif pad_type == SwitchPad.TYPE_MASKED:
+        mask_margin = kwargs.get('solder_mask_margin', 0.05)  # default 0.05mm
+
+        kwargs['type'] = Pad.TYPE_THT
+        kwargs['layers'] = SwitchPad.LAYERS_MASKED_FRONT
+        pads.append(PadGeometry.of(kwargs))
+
+        kwargs['type'] = Pad.TYPE_SMT
+        kwargs['size'] = _vector(kwargs.get('drill')) + Vector2D(mask_margin, mask_margin)
+        kwargs['layers'] = SwitchPad.LAYERS_FRONT_MASK
+        kwargs['offset'] = Vector2D(0, 0)
+        pads.append(PadGeometry.of(kwargs))
+
+    elif pad_type == SwitchPad.TYPE_SMALL_TOP:
+        annular_ring = kwargs.get('annular_ring', 0.13)  # default 0.13mm
+
+        kwargs['type'] = Pad.TYPE_THT
+        kwargs['layers'] = SwitchPad.LAYERS_BACK
+        pads.append(PadGeometry.of(kwargs))
+
+        kwargs['size'] = _vector(kwargs.get('drill')) + Vector2D(annular_ring, annular_ring)
+        kwargs['layers'] = SwitchPad.LAYERS_FRONT
+        kwargs['offset'] = Vector2D(0, 0)
+        pads.append(PadGeometry.of(kwargs))
+
+    return tuple(pads)
+
+
+def shared_childs(node):
+    # Children of node for walks that only read them, like the serializers
+    # and design rule checks. Nodes keeping shared geometry hand it out as
+    # is here, their getAllChilds() gives copies that can be changed.
+    shared = getattr(node, 'getSharedChilds', None)
+    return shared() if shared is not None else node.getAllChilds()
+
+
+class CompactPads(Node):
+    # Node holding its pads as shared PadGeometry. getSharedChilds() walks
+    # them as they are, getVirtualChilds() makes new Pad nodes of them for
+    # KicadModTree.
 
     def getVirtualChilds(self):
-        return self.virtual_childs
+        return [pad.node() for pad in self.pads]
 
+    def getSharedChilds(self):
+        return self.pads
 
-class SwitchPad(Node):
+
+class SwitchMountHole(CompactPads):
+    def __init__(self, **kwargs):
+        Node.__init__(self)
+        self.pads = _mount_hole_pads(_frozen(kwargs))
+
+
+class SwitchPad(CompactPads):
 
     TYPE_REGULAR = 'regular'
     TYPE_MASKED = 'masked'
@@ -36,64 +161,12 @@ class SwitchPad(Node):
 
         Node.__init__(self)
 
-        self.virtual_childs = []
-
-        self.type = kwargs.get('pad_type', SwitchPad.TYPE_MASKED)
+        self.type = kwargs.pop('pad_type', SwitchPad.TYPE_MASKED)
 
         if self.type not in SwitchPad._TYPES:
             raise ValueError(f'{self.type} is an invalid type for SwitchPad')
 
-        elif self.type == SwitchPad.TYPE_REGULAR:
-            self._init_regular_pad(**kwargs)
-        if self.type == SwitchPad.TYPE_MASKED:
-            self._init_masked_pad(**kwargs)
-        elif self.type == SwitchPad.TYPE_SMALL_TOP:
-            self._init_small_top_pad(**kwargs)
-
-    def _init_regular_pad(self, **kwargs):
-        kwargs.__setitem__('type', Pad.TYPE_THT)
-        kwargs.__setitem__('layers', Pad.LAYERS_THT)
-        self.virtual_childs.append(Pad(**kwargs))
-
-    def _init_masked_pad(self, **kwargs):
-        self.mask_margin = kwargs.get(
-            'solder_mask_margin', 0.05)  # default 0.05mm
-        self.drill_size = kwargs.get('drill')
-
-        kwargs.__setitem__('type', Pad.TYPE_THT)
-        kwargs.__setitem__('layers', SwitchPad.LAYERS_MASKED_FRONT)
-        self.virtual_childs.append(Pad(**kwargs))
-
-        size = Vector2D(self.drill_size, self.drill_size) if type(
-            self.drill_size) in [int, float] else Vector2D(self.drill_size)
-
-        kwargs.__setitem__('type', Pad.TYPE_SMT)
-        kwargs.__setitem__(
-            'size', size + Vector2D(self.mask_margin, self.mask_margin))
-        kwargs.__setitem__('layers', SwitchPad.LAYERS_FRONT_MASK)
-        kwargs.__setitem__('offset', Vector2D(0, 0))
-        self.virtual_childs.append(Pad(**kwargs))
-
-    def _init_small_top_pad(self, **kwargs):
-        self.annular_ring = kwargs.get('annular_ring', 0.13)  # default 0.13mm
-        self.drill_size = kwargs.get('drill')
-
-        kwargs.__setitem__('type', Pad.TYPE_THT)
-
-        kwargs.__setitem__('layers', SwitchPad.LAYERS_BACK)
-        self.virtual_childs.append(Pad(**kwargs))
-
-        size = Vector2D(self.drill_size, self.drill_size) if type(
-            self.drill_size) in [int, float] else Vector2D(self.drill_size)
-
-        kwargs.__setitem__(
-            'size', size + Vector2D(self.annular_ring, self.annular_ring))
-        kwargs.__setitem__('layers', SwitchPad.LAYERS_FRONT)
-        kwargs.__setitem__('offset', Vector2D(0, 0))
-        self.virtual_childs.append(Pad(**kwargs))
-
-    def getVirtualChilds(self):
-        return self.virtual_childs
+        self.pads = _switch_pads(self.type, _frozen(kwargs))
 
 
 def norm_vector(v):
@@ -105,12 +178,27 @@ def norm_vector(v):
 
 
 def offset_poly(poly: list, offset: float, origin: Vector2D = Vector2D(0, 0), outer_ccw=True):
+    # poly is usually a class level outline offset the same way for every
+    # instance of a switch, so the result is cached on its contents. The
+    # returned points are shared and immutable.
+    points = tuple((p.x, p.y) for p in map(Vector2D, poly))
+    origin = Vector2D(origin)
+    return _offset_poly(points, offset, (origin.x, origin.y), bool(outer_ccw))
+
+
+@lru_cache(maxsize=256)
+def _offset_poly(poly: tuple, offset: float, origin: tuple, outer_ccw: bool):
+    if np is not None:
+        return offset_polys([poly], offset, origin, outer_ccw,
+                            wrap_open=True)[0]
+
     new_poly = []
+    origin = Vector2D(origin)
     outer_ccw = 1 if outer_ccw else -1
     closed = poly[0] == poly[-1]
 
     if closed:
-        poly.pop()
+        poly = poly[:-1]
 
     num_points = len(poly)
 
@@ -134,9 +222,80 @@ def offset_poly(poly: list, offset: float, origin: Vector2D = Vector2D(0, 0), ou
 
         new_point = (curr_point + (bisn * bislen)) + origin
 
-        new_poly.append(new_point.round_to(0.001))
+        new_point = new_point.round_to(0.001)
+        new_poly.append((new_point.x, new_point.y))
 
     if closed:
         new_poly.append(new_poly[0])
 
-    return new_poly
+    return tuple(new_poly)
+
+
+def _norm_vectors(v):
+    radius = np.hypot(v[:, 0], v[:, 1])[:, None]
+    return np.divide(v, radius, out=np.zeros_like(v), where=radius != 0)
+
+
+def offset_polys(polys: list, offset: float, origin=(0, 0), outer_ccw=True,
+                 miter_limit: float = None, wrap_open: bool = False):
+    # Batch version of offset_poly, all points of all polylines are offset
+    # at once and rounded to 0.001mm. The end points of an open polyline
+    # are offset along the normal of their one segment, wrap_open offsets
+    # them as if the polyline was closed like offset_poly does, which the
+    # library footprints were generated with. miter_limit optionally caps
+    # how far a sharp corner is moved, as a multiple of offset. Returns a
+    # list of tuples of (x, y) points.
+    outer_ccw = 1 if outer_ccw else -1
+    origin = np.array([Vector2D(origin).x, Vector2D(origin).y])
+
+    points = []
+    closed = []
+    for poly in polys:
+        poly = np.array([(p.x, p.y) for p in map(Vector2D, poly)])
+        closed.append(bool((poly[0] == poly[-1]).all()))
+        points.append(poly[:-1] if closed[-1] else poly)
+
+    lengths = np.array([len(p) for p in points])
+    starts = np.cumsum(lengths) - lengths
+    first = np.repeat(starts, lengths)
+    size = np.repeat(lengths, lengths)
+    index = np.arange(lengths.sum()) - first
+
+    curr_point = np.concatenate(points) - origin
+    prev_point = curr_point[first + (index + size - 1) % size]
+    next_point = curr_point[first + (index + 1) % size]
+
+    vnn = _norm_vectors(next_point - curr_point)
+    vpn = _norm_vectors(curr_point - prev_point)
+
+    if not wrap_open:
+        is_open = ~np.array(closed, dtype=bool)
+        first_points = starts[is_open]
+        last_points = first_points + lengths[is_open] - 1
+        vpn[first_points] = vnn[first_points]
+        vnn[last_points] = vpn[last_points]
+
+    nnn = np.stack([vnn[:, 1], -vnn[:, 0]], axis=1)
+    npn = np.stack([vpn[:, 1] * outer_ccw, -vpn[:, 0] * outer_ccw], axis=1)
+
+    bisn = _norm_vectors((nnn + npn) * outer_ccw)
+
+    bislen = offset / np.sqrt(1 + nnn[:, 0]*npn[:, 0] + nnn[:, 1]*npn[:, 1])
+    if miter_limit is not None:
+        bislen = np.clip(bislen, -abs(miter_limit * offset),
+                         abs(miter_limit * offset))
+
+    new_points = (curr_point + (bisn * bislen[:, None])) + origin
+
+    # same as Vector2D.round_to(0.001), adding 0.0 turns -0.0 into 0.0 like
+    # the int returned by round() does
+    new_points = np.rint(new_points / 0.001) * 0.001 + 0.0
+
+    new_polys = []
+    for start, length, is_closed in zip(starts, lengths, closed):
+        new_poly = [tuple(p) for p in new_points[start:start + length].tolist()]
+        if is_closed:
+            new_poly.append(new_poly[0])
+        new_polys.append(tuple(new_poly))
+
+    return new_polys
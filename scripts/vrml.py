@@ -0,0 +1,493 @@
+import argparse
+import gzip
+import multiprocessing
+import os
+import re
+import sys
+from contextlib import nullcontext
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MODELS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                           'library', '3dmodels', '3d-library.3dshapes')
+
+HEADER = '#VRML V2.0 utf8\n'
+
+# coordinates are rounded to this many decimals of a VRML unit (0.1in), 4
+# keeps them within 0.13um
+DECIMALS = 4
+
+# IndexedFaceSet fields that do not depend on the order of the coordinates
+_PLAIN_FACE_SET = {'coord', 'coordIndex', 'creaseAngle', 'solid', 'ccw',
+                   'convex'}
+
+_TOKEN = re.compile(r'(?:[\s,]|#[^\n]*)*("(?:[^"\\]|\\.)*"|[{}\[\]]|'
+                    r'[^\s,{}\[\]#"]+)')
+_NOT_NUMBER = re.compile(r'[^\s,0-9eE+\-.]')
+
+
+class Node:
+    # A VRML node: its type, DEF name and (field, value) pairs in file order.
+    # Values are nodes, Use references, numpy arrays of numeric MF fields,
+    # lists of nodes, or tuples of the tokens of a single value field.
+
+    def __init__(self, type, fields=None, name=None):
+        self.type = type
+        self.fields = fields if fields is not None else []
+        self.name = name
+
+    def get(self, field, default=None):
+        for name, value in self.fields:
+            if name == field:
+                return value
+        return default
+
+    def set(self, field, value):
+        for i, (name, _) in enumerate(self.fields):
+            if name == field:
+                self.fields[i] = (field, value)
+                return
+        self.fields.append((field, value))
+
+
+class Use:
+    def __init__(self, name):
+        self.name = name
+
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        self.peeked = None
+
+    def peek(self):
+        if self.peeked is None:
+            match = _TOKEN.match(self.text, self.pos)
+            if match is None:
+                return None
+            self.peeked = match.group(1), match.end()
+        return self.peeked[0]
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise ValueError('unexpected end of file')
+        self.pos = self.peeked[1]
+        self.peeked = None
+        return token
+
+    def expect(self, token):
+        found = self.next()
+        if found != token:
+            raise ValueError(f'expected {token!r}, found {found!r}')
+
+    def nodes(self):
+        result = []
+        while self.peek() is not None:
+            result.append(self.node())
+        return result
+
+    def node(self):
+        token = self.next()
+        if token == 'USE':
+            return Use(self.next())
+        name = None
+        if token == 'DEF':
+            name = self.next()
+            token = self.next()
+        if token in ['PROTO', 'EXTERNPROTO', 'ROUTE']:
+            raise ValueError(f'{token} is not supported')
+
+        node = Node(token, name=name)
+        self.expect('{')
+        while self.peek() != '}':
+            field = self.next()
+            node.fields.append((field, self.value()))
+        self.next()
+        return node
+
+    def value(self):
+        token = self.peek()
+        if token == '[':
+            return self.array()
+        if token in ['DEF', 'USE'] or self._is_node(token):
+            return self.node()
+        values = []
+        while _is_scalar(self.peek()):
+            values.append(self.next())
+        return tuple(values)
+
+    def _is_node(self, token):
+        if token is None or _is_scalar(token) or token in '{}[]':
+            return False
+        match = _TOKEN.match(self.text, self.peeked[1])
+        return match is not None and match.group(1) == '{'
+
+    def array(self):
+        # numeric arrays are converted in one go, the bulk of a model
+        self.next()
+        end = self.text.find(']', self.pos)
+        if end >= 0 and not _NOT_NUMBER.search(self.text, self.pos, end):
+            values = self.text[self.pos:end].replace(',', ' ').split()
+            self.pos = end + 1
+            return np.array(values, dtype=float)
+
+        values = []
+        while self.peek() != ']':
+            if _is_scalar(self.peek()):
+                values.append(self.next())
+            else:
+                values.append(self.node())
+        self.next()
+        return values
+
+
+def _is_scalar(token):
+    return token is not None and (token[0] in '+-.0123456789"' or
+                                  token in ['TRUE', 'FALSE', 'NULL'])
+
+
+def parse(text):
+    return _Parser(text).nodes()
+
+
+def read(filename):
+    opener = gzip.open if filename.endswith('.wrz') else open
+    with opener(filename, 'rt', encoding='utf-8') as f:
+        return parse(f.read())
+
+
+def _number(token):
+    # numbers without trailing zeros, other tokens as they are
+    if token[0] == '"' or 'e' in token or 'E' in token or '.' not in token:
+        return token
+    token = token.rstrip('0').rstrip('.')
+    return '0' if token in ['', '-', '-0'] else token
+
+
+def _array(field, values, decimals):
+    # commas between elements like StepUp writes them, KiCad reads vectors
+    # up to a comma
+    if field.endswith('Index'):
+        return ','.join(map(str, values.astype(int).tolist()))
+    if decimals is None:
+        numbers = [_number(repr(v)) for v in values.tolist()]
+    else:
+        numbers = [_number(f'{v:.{decimals}f}')
+                   for v in np.round(values, decimals).tolist()]
+    if len(numbers) % 3:
+        return ','.join(numbers)
+    return ','.join(' '.join(numbers[i:i + 3])
+                    for i in range(0, len(numbers), 3))
+
+
+def _dump(value, decimals, field=None):
+    if isinstance(value, Use):
+        return f'USE {value.name}'
+    if isinstance(value, Node):
+        head = f'DEF {value.name} {value.type}' if value.name else value.type
+        fields = ' '.join(f'{name} {_dump(v, decimals, name)}'
+                          for name, v in value.fields)
+        return f'{head}{{{fields}}}'
+    if isinstance(value, np.ndarray):
+        return f'[{_array(field, value, decimals)}]'
+    if isinstance(value, list):
+        return '[' + ' '.join(v if isinstance(v, str) else _dump(v, decimals)
+                              for v in value) + ']'
+    return ' '.join(_number(token) for token in value)
+
+
+def dumps(nodes, decimals=None):
+    # Compact VRML text, one top-level node per line. Numeric arrays are
+    # rounded to decimals when given.
+    return HEADER + ''.join(_dump(node, decimals) + '\n' for node in nodes)
+
+
+def write(filename, text):
+    data = text.encode()
+    if filename.endswith('.wrz'):
+        data = gzip.compress(data, compresslevel=9, mtime=0)
+
+    tmp_filename = f'{filename}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_filename, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.unlink(tmp_filename)
+        raise
+    return len(data)
+
+
+def _material_key(material):
+    return tuple(sorted((name, tuple(float(t) for t in value))
+                        for name, value in material.fields))
+
+
+def _children(node):
+    for _, value in node.fields:
+        if isinstance(value, Node):
+            yield value
+        elif isinstance(value, list):
+            yield from (v for v in value if isinstance(v, Node))
+
+
+def shapes(nodes, defs=None):
+    # (Shape, Material or None) of every Shape in document order, USE
+    # references of materials resolved
+    defs = {} if defs is None else defs
+    for node in nodes:
+        if isinstance(node, Use):
+            continue
+        if node.name is not None:
+            defs[node.name] = node
+        if node.type == 'Shape':
+            appearance = node.get('appearance')
+            material = None
+            if isinstance(appearance, Node):
+                if appearance.name is not None:
+                    defs[appearance.name] = appearance
+                material = appearance.get('material')
+                if isinstance(material, Use):
+                    material = defs[material.name]
+                elif isinstance(material, Node) and material.name is not None:
+                    defs[material.name] = material
+            yield node, material
+        else:
+            yield from shapes(list(_children(node)), defs)
+
+
+def faces(index):
+    # face number of every coordIndex entry, -1 ends included, and the
+    # number of corners of every face, for an index ending with -1
+    end = index < 0
+    face = np.cumsum(end) - end
+    return face, np.bincount(face[~end], minlength=int(end.sum()))
+
+
+def _collapsed(face, vertex, lengths):
+    # faces with less than 3 corners or a vertex used twice
+    order = np.lexsort((vertex, face))
+    f, v = face[order], vertex[order]
+    result = lengths < 3
+    result[f[1:][(f[1:] == f[:-1]) & (v[1:] == v[:-1])]] = True
+    return result
+
+
+def terminated(index):
+    # coordIndex as ints ending with -1, the last face may leave it out
+    index = index.astype(int)
+    if len(index) and index[-1] >= 0:
+        index = np.append(index, -1)
+    return index
+
+
+def _dedupe(face_set, decimals):
+    # merges vertices that round to the same point and drops the faces and
+    # points this leaves unused
+    coord = face_set.get('coord')
+    index = face_set.get('coordIndex')
+    if not isinstance(coord, Node) or coord.name is not None or \
+            not isinstance(index, np.ndarray) or \
+            set(name for name, _ in face_set.fields) - _PLAIN_FACE_SET:
+        return
+
+    points = np.round(coord.get('point').reshape(-1, 3), decimals)
+    unique, first, inverse = np.unique(points, axis=0, return_index=True,
+                                       return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    index = terminated(index)
+    corner = index >= 0
+    index[corner] = rank[inverse.ravel()[index[corner]]]
+
+    face, lengths = faces(index)
+    collapsed = _collapsed(face[corner], index[corner], lengths)
+    index = index[~collapsed[face]]
+    points = unique[order]
+
+    used = np.unique(index[index >= 0])
+    if len(used) != len(points):
+        remap = np.full(len(points), -1)
+        remap[used] = np.arange(len(used))
+        index[index >= 0] = remap[index[index >= 0]]
+        points = points[used]
+
+    coord.set('point', points.ravel())
+    face_set.set('coordIndex', index)
+
+
+def compact(nodes, decimals=DECIMALS):
+    # Rounds coordinates, merges duplicate vertices, shares identical
+    # materials through DEF/USE and drops shapes without geometry, which
+    # StepUp exports only to DEF its materials. Changes nodes in place.
+    materials = {}
+    result = []
+    for node, material in list(shapes(nodes)):
+        geometry = node.get('geometry')
+        if geometry is None:
+            continue
+
+        if material is not None:
+            key = _material_key(material)
+            appearance = node.get('appearance')
+            if key in materials:
+                appearance.set('material', Use(materials[key]))
+            else:
+                materials[key] = f'M{len(materials)}'
+                appearance.set('material', Node(
+                    'Material', list(material.fields), materials[key]))
+
+        if isinstance(geometry, Node) and geometry.type == 'IndexedFaceSet':
+            _dedupe(geometry, decimals)
+        result.append(node)
+
+    # shapes nested in groups stay where they are
+    if all(node.type == 'Shape' for node in nodes
+           if isinstance(node, Node)):
+        return result
+    return nodes
+
+
+def _corners(nodes):
+    # per Shape with geometry: material key, coordIndex and the corner
+    # coordinates of its faces, (corners, 3)
+    result = []
+    for node, material in shapes(nodes):
+        face_set = node.get('geometry')
+        if face_set is None:
+            continue
+        key = _material_key(material) if material is not None else None
+        if face_set.type != 'IndexedFaceSet' or \
+                not isinstance(face_set.get('coord'), Node):
+            result.append((key, np.zeros(0, dtype=int), np.zeros((0, 3))))
+            continue
+        index = terminated(face_set.get('coordIndex'))
+        points = face_set.get('coord').get('point').reshape(-1, 3)
+        result.append((key, index, points[index[index >= 0]]))
+    return result
+
+
+def verify(original, compacted, decimals=DECIMALS):
+    # Differences between a model and its compacted version: the same
+    # shapes and materials, and the same faces with corners within rounding,
+    # leaving out faces the rounding collapsed
+    problems = []
+    tolerance = 0.5 * 10 ** -decimals + 1e-9
+    a, b = _corners(original), _corners(compacted)
+    if len(a) != len(b):
+        return [f'{len(a)} shapes became {len(b)}']
+
+    for n, ((key_a, index_a, corners_a),
+            (key_b, index_b, corners_b)) in enumerate(zip(a, b)):
+        if key_a != key_b:
+            problems.append(f'shape {n}: material differs')
+
+        face, lengths = faces(index_a)
+        corner = index_a >= 0
+        _, vertex = np.unique(np.round(corners_a, decimals), axis=0,
+                              return_inverse=True)
+        keep = ~_collapsed(face[corner], vertex.ravel(), lengths)
+        corners_a = corners_a[keep[face[corner]]]
+
+        if not np.array_equal(lengths[keep], faces(index_b)[1]):
+            problems.append(f'shape {n}: faces differ')
+        elif len(corners_a) and \
+                np.abs(corners_a - corners_b).max() > tolerance:
+            problems.append(f'shape {n}: coordinates moved by '
+                            f'{np.abs(corners_a - corners_b).max():g}')
+    return problems
+
+
+def compact_model(source, target, decimals=DECIMALS):
+    # Compacts source into target (.wrl or gzipped .wrz) after checking
+    # that the compacted model reads back as the same geometry. Returns the
+    # sizes of source and target.
+    original = read(source)
+    text = dumps(compact(read(source), decimals), decimals)
+    problems = verify(original, parse(text), decimals)
+    if problems:
+        raise ValueError(f'{source}: ' + ', '.join(problems))
+    return os.path.getsize(source), write(target, text)
+
+
+def _compact_model_task(task):
+    return task[0], compact_model(*task)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compact VRML models: round coordinates, merge duplicate '
+                    'vertices and materials and strip whitespace. Every '
+                    'model is read back and compared before it is written.',
+        usage='%(prog)s [options] [model.wrl ...]')
+
+    parser.add_argument('models', type=str, nargs='*',
+                        help='models to compact (default: every .wrl of '
+                             'the library)')
+
+    output = parser.add_mutually_exclusive_group(required=True)
+
+    output.add_argument('-o', '--output',
+                        type=str, default=None,
+                        help='output path')
+
+    output.add_argument('--in-place',
+                        action='store_true',
+                        help='write next to each model, replacing the .wrl '
+                             'models unless --wrz is given')
+
+    parser.add_argument('-d', '--decimals',
+                        type=int, default=DECIMALS,
+                        help='decimals coordinates are rounded to '
+                             '(default: %(default)s)')
+
+    parser.add_argument('--wrz',
+                        action='store_true',
+                        help='write gzipped .wrz models, reference them with '
+                             'keyswitch_generator.py --model-format wrz')
+
+    parser.add_argument('-j', '--jobs',
+                        type=int, default=1,
+                        help='number of worker processes, 0 uses all cores '
+                             '(default: %(default)s)')
+
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error('numpy is required, install it with pip install numpy')
+
+    models = args.models or sorted(
+        os.path.join(MODELS_PATH, f) for f in os.listdir(MODELS_PATH)
+        if f.endswith('.wrl'))
+
+    tasks = []
+    for model in models:
+        name = os.path.splitext(os.path.basename(model))[0]
+        target = os.path.join(args.output or os.path.dirname(model),
+                              name + ('.wrz' if args.wrz else '.wrl'))
+        tasks.append((model, target, args.decimals))
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+
+    jobs = args.jobs or os.cpu_count()
+    pool = multiprocessing.Pool(jobs) if jobs != 1 else None
+    before = after = 0
+    with pool or nullcontext():
+        results = map(_compact_model_task, tasks) if pool is None \
+            else pool.imap(_compact_model_task, tasks)
+
+        for model, (size, compacted) in results:
+            print(f'{os.path.basename(model)}: {size} -> {compacted} bytes')
+            before += size
+            after += compacted
+
+    print(f'{len(tasks)} models compacted, {before} -> {after} bytes')
+    sys.exit(0)